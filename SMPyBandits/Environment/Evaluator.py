@@ -8,8 +8,12 @@ __author__ = "Lilian Besson"
 __version__ = "0.9"
 
 # Generic imports
-from copy import deepcopy
+from copy import copy, deepcopy
+from multiprocessing import cpu_count
+import os
 import random
+import shutil
+import tempfile
 import time
 # Scientific imports
 import numpy as np
@@ -112,55 +116,50 @@ class Evaluator(object):
         self.__initEnvironments__()
 
         # Internal vectorial memory
-        self.rewards = np.zeros((self.nbPolicies, len(self.envs), self.horizon))  #: For each env, history of rewards, ie accumulated rewards
+        # float32 is plenty for these accumulators (rewards are typically in [0, 1]) and halves the memory traffic of the += reductions; the getters cumsum in float64 to keep accuracy
+        self.rewards = np.zeros((self.nbPolicies, len(self.envs), self.horizon), dtype=np.float32)  #: For each env, history of rewards, ie accumulated rewards
         self.lastCumRewards = np.zeros((self.nbPolicies, len(self.envs), self.repetitions))  #: For each env, last accumulated rewards, to compute variance and histogram of whole regret R_T
         self.minCumRewards = np.inf + np.zeros((self.nbPolicies, len(self.envs), self.horizon))  #: For each env, history of minimum of rewards, to compute amplitude (+- STD)
         self.maxCumRewards = -np.inf + np.zeros((self.nbPolicies, len(self.envs), self.horizon))  #: For each env, history of maximum of rewards, to compute amplitude (+- STD)
 
         if STORE_REWARDS_SQUARED:
-            self.rewardsSquared = np.zeros((self.nbPolicies, len(self.envs), self.horizon))  #: For each env, history of rewards squared
+            self.rewardsSquared = np.zeros((self.nbPolicies, len(self.envs), self.horizon), dtype=np.float32)  #: For each env, history of rewards squared
         if STORE_ALL_REWARDS:
-            self.allRewards = np.zeros((self.nbPolicies, len(self.envs), self.horizon, self.repetitions))  #: For each env, full history of rewards
-
-        self.bestArmPulls = dict()  #: For each env, keep the history of best arm pulls
-        self.pulls = dict()  #: For each env, keep cumulative counts of all arm pulls
-        if self.moreAccurate: self.allPulls = dict()  #: For each env, keep cumulative counts of all arm pulls
-        self.lastPulls = dict()  #: For each env, keep cumulative counts of all arm pulls
-        self.runningTimes = dict()  #: For each env, keep the history of running times
-        self.memoryConsumption = dict()  #: For each env, keep the history of running times
+            self.allRewards = np.zeros((self.nbPolicies, len(self.envs), self.horizon, self.repetitions), dtype=np.float32)  #: For each env, full history of rewards
+
+        # Contiguous arrays indexed by [envId, policyId, ...], instead of dicts of per-env arrays:
+        # envs can have different nbArms, so the arm axis is padded to the largest one and the getters slice the relevant prefix
+        max_arms = max(env.nbArms for env in self.envs)
+        self.bestArmPulls = np.zeros((len(self.envs), self.nbPolicies, self.horizon), dtype=np.int32)  #: For each env, keep the history of best arm pulls
+        self.pulls = np.zeros((len(self.envs), self.nbPolicies, max_arms), dtype=np.int32)  #: For each env, keep cumulative counts of all arm pulls
+        if self.moreAccurate: self.allPulls = np.zeros((len(self.envs), self.nbPolicies, max_arms, self.horizon), dtype=np.int32)  #: For each env, keep cumulative counts of all arm pulls
+        self.lastPulls = np.zeros((len(self.envs), self.nbPolicies, max_arms, self.repetitions), dtype=np.int32)  #: For each env, keep cumulative counts of all arm pulls
+        self.runningTimes = np.zeros((len(self.envs), self.nbPolicies, self.repetitions))  #: For each env, keep the history of running times
+        self.memoryConsumption = np.zeros((len(self.envs), self.nbPolicies, self.repetitions))  #: For each env, keep the history of running times
         # XXX: WARNING no memorized vectors should have dimension duration * repetitions, that explodes the RAM consumption!
-        for envId in range(len(self.envs)):
-            self.bestArmPulls[envId] = np.zeros((self.nbPolicies, self.horizon), dtype=np.int32)
-            self.pulls[envId] = np.zeros((self.nbPolicies, self.envs[envId].nbArms), dtype=np.int32)
-            if self.moreAccurate: self.allPulls[envId] = np.zeros((self.nbPolicies, self.envs[envId].nbArms, self.horizon), dtype=np.int32)
-            self.lastPulls[envId] = np.zeros((self.nbPolicies, self.envs[envId].nbArms, self.repetitions), dtype=np.int32)
-            self.runningTimes[envId] = np.zeros((self.nbPolicies, self.repetitions))
-            self.memoryConsumption[envId] = np.zeros((self.nbPolicies, self.repetitions))
+        # Preallocated buffers, reused for each policy when aggregating the results of all the repetitions (avoids reallocating repetitions x horizon arrays for each policy)
+        self._all_rewards = np.empty((self.repetitions, self.horizon))
+        self._all_choices = np.empty((self.repetitions, self.horizon), dtype=int)
+        self._scratch_RxH = np.empty((self.repetitions, self.horizon))  #: Scratch buffer for the cumsum/square intermediates of store(), written with out= instead of reallocated
+        self._mask_RxH = np.empty((self.repetitions, self.horizon), dtype=bool)  #: Scratch buffer for the best-arm masks, one contiguous row per repetition
         print("Number of environments to try:", len(self.envs))
         # To speed up plotting
         self._times = np.arange(1, 1 + self.horizon)
+        self._cached_cumRegrets = dict()  #: Cache the cumulated regret vectors: every plotting method recomputes them for each policy, but they do not change once the simulation is done
+        self._cached_rewards_norm = dict()  #: Cache the rewards-divided-by-repetitions vectors, for the same reason
 
     # --- Init methods
 
     def __initEnvironments__(self):
-        """ Create environments."""
-        for configuration_arms in self.cfg['environment']:
-            if isinstance(configuration_arms, dict) \
-               and "arm_type" in configuration_arms and "params" in configuration_arms \
-               and "function" in configuration_arms["params"] and "args" in configuration_arms["params"]:
-                self.envs.append(DynamicMAB(configuration_arms))
-            elif isinstance(configuration_arms, dict) \
-               and "arm_type" in configuration_arms and configuration_arms["arm_type"] == "Markovian" \
-               and "params" in configuration_arms \
-               and "transitions" in configuration_arms["params"]:
-                self.envs.append(MarkovianMAB(configuration_arms))
-            elif isinstance(configuration_arms, dict) \
-               and "arm_type" in configuration_arms and "params" in configuration_arms \
-               and "change_lower_amplitude" in configuration_arms:
-                self.envs.append(IncreasingMAB(configuration_arms))
-                IncreasingMAB
-            else:
-                self.envs.append(MAB(configuration_arms))
+        """ Create environments, in parallel with joblib if there are many of them."""
+        configurations = self.cfg['environment']
+        if USE_JOBLIB and self.cfg['n_jobs'] != 1 and len(configurations) > 4:
+            # Constructing many MAB problems is a serial warm-up (DynamicMAB draws arms, MarkovianMAB builds its chains), worth dispatching for large benchmarks; for a few envs the joblib overhead is not worth it
+            self.envs = Parallel(n_jobs=self.cfg['n_jobs'], verbose=self.cfg['verbosity'])(
+                delayed(_make_env)(configuration_arms) for configuration_arms in configurations
+            )
+        else:
+            self.envs = [_make_env(configuration_arms) for configuration_arms in configurations]
 
     def __initPolicies__(self, env):
         """ Create or initialize policies."""
@@ -203,6 +202,8 @@ class Evaluator(object):
     def startOneEnv(self, envId, env):
         """Simulate that env."""
         print("\n\nEvaluating environment:", repr(env))
+        self._cached_cumRegrets.clear()  # new data is coming, the cached vectors are stale
+        self._cached_rewards_norm.clear()
         self.policies = []
         self.__initPolicies__(env)
         # Precompute rewards
@@ -211,41 +212,79 @@ class Evaluator(object):
         else:
             allrewards = None
 
-        def store(r, policyId, repeatId):
-            """ Store the result of the #repeatId experiment, for the #policyId policy."""
-            self.rewards[policyId, envId, :] += r.rewards
-            self.lastCumRewards[policyId, envId, repeatId] = np.sum(r.rewards)
+        def store(results, policyId):
+            """ Store the results of all the repetitions, for the #policyId policy, all at once (vectorized on the repetitions)."""
+            # Gather the arrays of all the Result objects in the preallocated buffers, to replace the Python-level loop on repetitions by single NumPy reductions
+            all_rewards = self._all_rewards  # shape (repetitions, horizon)
+            all_choices = self._all_choices  # shape (repetitions, horizon)
+            for repeatId, r in enumerate(results):
+                all_rewards[repeatId, :] = r.rewards
+                all_choices[repeatId, :] = r.choices
+            all_pulls = np.stack([r.pulls for r in results])  # shape (repetitions, nbArms), small so not worth a buffer
+            self.rewards[policyId, envId, :] += all_rewards.sum(axis=0)
             if hasattr(self, 'rewardsSquared'):
-                self.rewardsSquared[policyId, envId, :] += (r.rewards ** 2)
+                np.square(all_rewards, out=self._scratch_RxH)
+                self.rewardsSquared[policyId, envId, :] += self._scratch_RxH.sum(axis=0)
             if hasattr(self, 'allRewards'):
-                self.allRewards[policyId, envId, :, repeatId] = r.rewards
+                self.allRewards[policyId, envId, :, :] = all_rewards.T
+            # The scratch buffer can now be reused for the cumulated rewards
+            all_cumRewards = np.cumsum(all_rewards, axis=1, out=self._scratch_RxH)
+            self.lastCumRewards[policyId, envId, :] = all_cumRewards[:, -1]
             if hasattr(self, 'minCumRewards'):
-                self.minCumRewards[policyId, envId, :] = np.minimum(self.minCumRewards[policyId, envId, :], np.cumsum(r.rewards)) if repeatId > 1 else np.cumsum(r.rewards)
+                self.minCumRewards[policyId, envId, :] = all_cumRewards.min(axis=0)
             if hasattr(self, 'maxCumRewards'):
-                self.maxCumRewards[policyId, envId, :] = np.maximum(self.maxCumRewards[policyId, envId, :], np.cumsum(r.rewards)) if repeatId > 1 else np.cumsum(r.rewards)
-            self.bestArmPulls[envId][policyId, :] += np.cumsum(np.in1d(r.choices, r.indexes_bestarm))
-            self.pulls[envId][policyId, :] += r.pulls
-            if self.moreAccurate: self.allPulls[envId][policyId, :, :] += np.array([1 * (r.choices == armId) for armId in range(env.nbArms)])  # XXX consumes a lot of zeros but it is not so costly
-            self.lastPulls[envId][policyId, :, repeatId] = r.pulls
-            self.runningTimes[envId][policyId, repeatId] = r.running_time
-            self.memoryConsumption[envId][policyId, repeatId] = r.memory_consumption
-
-        # Start for all policies
-        for policyId, policy in enumerate(self.policies):
-            print("\n\n\n- Evaluating policy #{}/{}: {} ...".format(policyId + 1, self.nbPolicies, policy))
-            if self.useJoblib:
-                seeds = np.random.randint(low=0, high=100 * self.repetitions, size=self.repetitions)
-                repeatIdout = 0
-                for r in Parallel(n_jobs=self.cfg['n_jobs'], verbose=self.cfg['verbosity'])(
-                    delayed(delayed_play)(env, policy, self.horizon, random_shuffle=self.random_shuffle, random_invert=self.random_invert, nb_random_events=self.nb_random_events, allrewards=allrewards, seed=seeds[repeatId], repeatId=repeatId, useJoblib=self.useJoblib)
-                    for repeatId in tqdm(range(self.repetitions), desc="Repeat||")
-                ):
-                    store(r, policyId, repeatIdout)
-                    repeatIdout += 1
-            else:
-                for repeatId in tqdm(range(self.repetitions), desc="Repeat"):
-                    r = delayed_play(env, policy, self.horizon, random_shuffle=self.random_shuffle, random_invert=self.random_invert, nb_random_events=self.nb_random_events, allrewards=allrewards, repeatId=repeatId, useJoblib=self.useJoblib)
-                    store(r, policyId, repeatId)
+                self.maxCumRewards[policyId, envId, :] = all_cumRewards.max(axis=0)
+            # XXX the best arms can change, both with the repetitions (DynamicMAB) and the time (random events), so the mask is built for each repetition
+            mask_bestarm = self._mask_RxH
+            for repeatId, r in enumerate(results):
+                _bestarm_mask(r, all_choices[repeatId], env.nbArms, out=mask_bestarm[repeatId])
+            # sum over repetitions commutes with cumsum over time, and the horizon-length cumsum is much cheaper than a repetitions x horizon one
+            self.bestArmPulls[envId, policyId, :] += np.cumsum(mask_bestarm.sum(axis=0))
+            self.pulls[envId, policyId, :env.nbArms] += all_pulls.sum(axis=0)
+            if self.moreAccurate: self.allPulls[envId, policyId, :env.nbArms, :] += np.array([(all_choices == armId).sum(axis=0) for armId in range(env.nbArms)])  # XXX consumes a lot of zeros but it is not so costly
+            self.lastPulls[envId, policyId, :env.nbArms, :] = all_pulls.T
+            self.runningTimes[envId, policyId, :] = [r.running_time for r in results]
+            self.memoryConsumption[envId, policyId, :] = [r.memory_consumption for r in results]
+
+        # Shared memory-mapped buffers: the joblib workers write their reward/choice vectors straight into these files instead of pickling horizon-length arrays back to the parent
+        mmap_dir = None
+        rewards_mm = choices_mm = None
+        if self.useJoblib:
+            mmap_dir = tempfile.mkdtemp(prefix="SMPyBandits_mmap_")
+            rewards_mm = np.memmap(os.path.join(mmap_dir, "rewards.dat"), dtype=np.float64, mode="w+", shape=(self.repetitions, self.horizon))
+            choices_mm = np.memmap(os.path.join(mmap_dir, "choices.dat"), dtype=np.int64, mode="w+", shape=(self.repetitions, self.horizon))
+
+        try:
+            # Start for all policies
+            for policyId, policy in enumerate(self.policies):
+                print("\n\n\n- Evaluating policy #{}/{}: {} ...".format(policyId + 1, self.nbPolicies, policy))
+                if self.useJoblib:
+                    seeds = np.random.randint(low=0, high=100 * self.repetitions, size=self.repetitions)
+                    # One task per worker instead of one task per repetition: each worker runs a whole
+                    # batch in a tight loop, so the pickling/IPC cost of env and policy is paid once per batch
+                    n_jobs = self.cfg['n_jobs']
+                    if n_jobs < 0:  # Same convention as joblib: -1 means all CPUs, -2 all but one, etc
+                        n_jobs = max(1, cpu_count() + 1 + n_jobs)
+                    batches = np.array_split(np.arange(self.repetitions), min(n_jobs, self.repetitions))
+                    results = Parallel(n_jobs=self.cfg['n_jobs'], verbose=self.cfg['verbosity'])(
+                        delayed(delayed_play_batch)(env, policy, self.horizon, random_shuffle=self.random_shuffle, random_invert=self.random_invert, nb_random_events=self.nb_random_events, allrewards=allrewards, seeds=seeds[repeatIds], repeatIds=repeatIds, useJoblib=self.useJoblib, rewards_mm=rewards_mm, choices_mm=choices_mm)
+                        for repeatIds in tqdm(batches, desc="Batch||")
+                    )
+                    results = [r for batch in results for r in batch]
+                    # Re-attach the memmap rows to the Result objects (they come back with rewards/choices stripped)
+                    for repeatId, r in enumerate(results):
+                        r.rewards = rewards_mm[repeatId]
+                        r.choices = choices_mm[repeatId]
+                else:
+                    results = [
+                        delayed_play(env, policy, self.horizon, random_shuffle=self.random_shuffle, random_invert=self.random_invert, nb_random_events=self.nb_random_events, allrewards=allrewards, repeatId=repeatId, useJoblib=self.useJoblib)
+                        for repeatId in tqdm(range(self.repetitions), desc="Repeat")
+                    ]
+                store(results, policyId)
+        finally:
+            if mmap_dir is not None:
+                del rewards_mm, choices_mm
+                shutil.rmtree(mmap_dir, ignore_errors=True)
 
     # --- Save to disk methods
 
@@ -295,7 +334,7 @@ class Evaluator(object):
                     print("Error: when saving the Evaluator object to a HDF5 file, the attribute named {} (value {} of type {}) couldn't be saved. Skipping...".format(name_of_attr, value, type(value)))  # DEBUG
             # 4.c. store data for that env
             for name_of_dataset in ["allPulls", "lastPulls", "runningTimes", "memoryConsumption"]:
-                if not ( hasattr(self, name_of_dataset) and envId in getattr(self, name_of_dataset) ): continue
+                if not hasattr(self, name_of_dataset): continue
                 data = getattr(self, name_of_dataset)[envId]
                 try: sbgrp.create_dataset(name_of_dataset, data=data)
                 except (ValueError, TypeError) as e:
@@ -339,22 +378,28 @@ class Evaluator(object):
 
     def getPulls(self, policyId, envId=0):
         """Extract mean pulls."""
-        return self.pulls[envId][policyId, :] / float(self.repetitions)
+        return self.pulls[envId, policyId, :self.envs[envId].nbArms] / float(self.repetitions)
 
     def getBestArmPulls(self, policyId, envId=0):
         """Extract mean best arm pulls."""
         # We have to divide by a arange() = cumsum(ones) to get a frequency
-        return self.bestArmPulls[envId][policyId, :] / (float(self.repetitions) * self._times)
+        return self.bestArmPulls[envId, policyId, :] / (float(self.repetitions) * self._times)
 
     def getRewards(self, policyId, envId=0):
-        """Extract mean rewards."""
-        return self.rewards[policyId, envId, :] / float(self.repetitions)
+        """Extract mean rewards.
+
+        .. warning:: The returned array is cached and shared between calls, don't modify it in place!
+        """
+        key = (policyId, envId)
+        if key not in self._cached_rewards_norm:
+            self._cached_rewards_norm[key] = self.rewards[policyId, envId, :] / float(self.repetitions)
+        return self._cached_rewards_norm[key]
 
     def getAverageWeightedSelections(self, policyId, envId=0):
         """Extract weighted count of selections."""
         weighted_selections = np.zeros(self.horizon)
         for armId, mean in enumerate(self.envs[envId].means):
-            mean_selections = self.allPulls[envId][policyId, armId, :] / float(self.repetitions)
+            mean_selections = self.allPulls[envId, policyId, armId, :] / float(self.repetitions)
             weighted_selections += mean * mean_selections
         return weighted_selections
 
@@ -365,7 +410,7 @@ class Evaluator(object):
     def getCumulatedRegret_LessAccurate(self, policyId, envId=0):
         """Compute cumulative regret, based on accumulated rewards."""
         # return self._times * self.envs[envId].maxArm - np.cumsum(self.getRewards(policyId, envId))
-        return np.cumsum(self.envs[envId].maxArm - self.getRewards(policyId, envId))
+        return np.cumsum(self.envs[envId].maxArm - self.getRewards(policyId, envId), dtype=np.float64)
 
     def getCumulatedRegret_MoreAccurate(self, policyId, envId=0):
         """Compute cumulative regret, based on counts of selections and not actual rewards."""
@@ -376,10 +421,13 @@ class Evaluator(object):
         """Using either the more accurate or the less accurate regret count."""
         moreAccurate = moreAccurate if moreAccurate is not None else self.moreAccurate
         # print("Computing the vector of mean cumulated regret with '{}' accurate method...".format("more" if moreAccurate else "less"))  # DEBUG
-        if moreAccurate:
-            return self.getCumulatedRegret_MoreAccurate(policyId, envId=envId)
-        else:
-            return self.getCumulatedRegret_LessAccurate(policyId, envId=envId)
+        key = (policyId, envId, moreAccurate)
+        if key not in self._cached_cumRegrets:  # the plotting methods ask for the same vectors again and again, compute each only once
+            if moreAccurate:
+                self._cached_cumRegrets[key] = self.getCumulatedRegret_MoreAccurate(policyId, envId=envId)
+            else:
+                self._cached_cumRegrets[key] = self.getCumulatedRegret_LessAccurate(policyId, envId=envId)
+        return self._cached_cumRegrets[key]
 
     def getLastRegrets_LessAccurate(self, policyId, envId=0):
         """Extract last regrets, based on accumulated rewards."""
@@ -389,7 +437,7 @@ class Evaluator(object):
         """Extract weighted count of selections."""
         all_last_weighted_selections = np.zeros(self.repetitions)
         for armId, mean in enumerate(self.envs[envId].means):
-            last_selections = self.lastPulls[envId][policyId, armId, :]
+            last_selections = self.lastPulls[envId, policyId, armId, :]
             all_last_weighted_selections += mean * last_selections
         return all_last_weighted_selections
 
@@ -408,7 +456,7 @@ class Evaluator(object):
 
     def getAverageRewards(self, policyId, envId=0):
         """Extract mean rewards (not `rewards` but `cumsum(rewards)/cumsum(1)`."""
-        return np.cumsum(self.getRewards(policyId, envId)) / self._times
+        return np.cumsum(self.getRewards(policyId, envId), dtype=np.float64) / self._times
 
     def getRewardsSquared(self, policyId, envId=0):
         """Extract rewards squared."""
@@ -436,7 +484,7 @@ class Evaluator(object):
         # # Renormalize this standard deviation
         # # stdY /= YMAX
         allRewards = self.allRewards[policyId, envId, :, :]
-        return np.std(np.cumsum(allRewards, axis=0), axis=1)
+        return np.std(np.cumsum(allRewards, axis=0, dtype=np.float64), axis=1)
 
     def getMaxMinReward(self, policyId, envId=0):
         """Extract amplitude of rewards as maxCumRewards - minCumRewards."""
@@ -445,14 +493,14 @@ class Evaluator(object):
 
     def getRunningTimes(self, envId=0):
         """Get the means and stds and list of running time of the different policies."""
-        all_times = [ self.runningTimes[envId][policyId, :] for policyId in range(self.nbPolicies) ]
+        all_times = [ self.runningTimes[envId, policyId, :] for policyId in range(self.nbPolicies) ]
         means = [ np.mean(times) for times in all_times ]
         stds  = [ np.std(times) for times in all_times ]
         return means, stds, all_times
 
     def getMemoryConsumption(self, envId=0):
         """Get the means and stds and list of memory consumptions of the different policies."""
-        all_memories = [ self.memoryConsumption[envId][policyId, :] for policyId in range(self.nbPolicies) ]
+        all_memories = [ self.memoryConsumption[envId, policyId, :] for policyId in range(self.nbPolicies) ]
         for policyId in range(self.nbPolicies):
             all_memories[policyId] = [ m for m in all_memories[policyId] if m > 0 ]
         means = [ np.mean(memories) for memories in all_memories ]
@@ -484,7 +532,7 @@ class Evaluator(object):
             else:
                 Y = self.getCumulatedRegret(i, envId, moreAccurate=moreAccurate)
                 if normalizedRegret:
-                    Y /= np.log(X + 2)   # XXX prevent /0
+                    Y = Y / np.log(X + 2)   # XXX prevent /0. Not in-place: Y is the cached cumulated regret vector!
             ymin = min(ymin, np.min(Y))
             lw = 5 if ('$N=' in policy.__cachedstr__ or 'Aggr' in policy.__cachedstr__ or 'CORRAL' in policy.__cachedstr__ or 'LearnExp' in policy.__cachedstr__ or 'Exp4' in policy.__cachedstr__) else 3
             if semilogx or loglog:
@@ -640,10 +688,11 @@ class Evaluator(object):
         print("\nFinal ranking for this environment #{} :".format(envId))
         nbPolicies = self.nbPolicies
         lastY = np.zeros(nbPolicies)
+        window = max(1, int(self.averageOn * self.horizon))
         for i, policy in enumerate(self.policies):
             Y = self.getCumulatedRegret(i, envId, moreAccurate=moreAccurate)
             if self.finalRanksOnAverage:
-                lastY[i] = np.mean(Y[-int(self.averageOn * self.horizon)])   # get average value during the last 0.5% of the iterations
+                lastY[i] = np.mean(Y[-window:])   # get average value during the last 0.5% of the iterations
             else:
                 lastY[i] = Y[-1]  # get the last value
         # Sort lastY and give ranking
@@ -759,12 +808,98 @@ class Evaluator(object):
         return fig
 
 
+# Helper function for the environment construction
+
+def _make_env(configuration_arms):
+    """ Build the right kind of MAB problem (Dynamic, Markovian, Increasing or static) from one configuration dictionary."""
+    if isinstance(configuration_arms, dict) \
+       and "arm_type" in configuration_arms and "params" in configuration_arms \
+       and "function" in configuration_arms["params"] and "args" in configuration_arms["params"]:
+        return DynamicMAB(configuration_arms)
+    elif isinstance(configuration_arms, dict) \
+       and "arm_type" in configuration_arms and configuration_arms["arm_type"] == "Markovian" \
+       and "params" in configuration_arms \
+       and "transitions" in configuration_arms["params"]:
+        return MarkovianMAB(configuration_arms)
+    elif isinstance(configuration_arms, dict) \
+       and "arm_type" in configuration_arms and "params" in configuration_arms \
+       and "change_lower_amplitude" in configuration_arms:
+        return IncreasingMAB(configuration_arms)
+    else:
+        return MAB(configuration_arms)
+
+
+# Helper function for the accumulation of results
+
+def _bestarm_mask(r, choices, nbArms, out):
+    """ Boolean mask of the time steps where the choice was (one of) the best arm(s), written into ``out``.
+
+    - Equivalent to ``np.in1d(r.choices, r.indexes_bestarm)``, but a plain equality test (one best arm, the common case) or a boolean lookup-table indexing (several best arms) avoids the sorting pass of ``in1d``, and writing into a preallocated row keeps the work in one contiguous buffer.
+    """
+    bests = np.unique(np.asarray(r.indexes_bestarm).ravel())
+    if len(bests) == 1:
+        np.equal(choices, bests[0], out=out)
+    else:
+        lut = np.zeros(nbArms, dtype=bool)
+        lut[bests] = True
+        np.take(lut, choices, out=out)
+    return out
+
+
 # Helper function for the parallelization
 
+# XXX Here a *real* numba.jit is needed: the dummy fallback decorator of usenumba would
+# leave a scalar Python loop that is slower than the generic object-oriented path below.
+try:
+    from numba import jit as numba_jit
+    USE_NUMBA_PLAY = True
+except ImportError:
+    USE_NUMBA_PLAY = False
+
+
+def _jitted_ucb_play(allrewards, choices, rewards, pulls, sumRewards, horizon, nbArms, lower, amplitude, seed):
+    """ Core time loop of :func:`delayed_play`, for a pure UCB policy playing against pre-computed rewards.
+
+    - Fills ``choices``, ``rewards``, ``pulls`` and ``sumRewards`` in place,
+    - Written with only scalar arithmetic so numba can compile it to native code (10x-100x faster than the interpreted loop).
+    """
+    if seed >= 0:
+        np.random.seed(seed)  # numba has its own internal random state, it has to be seeded in compiled code
+    candidates = np.empty(nbArms, np.int64)
+    t = 0
+    for i in range(horizon):
+        # Compute the UCB index of each arm, and keep the list of arms with maximal index (ties)
+        nbMax = 0
+        bestIndex = -np.inf
+        for arm in range(nbArms):
+            if pulls[arm] < 1:
+                index = np.inf
+            else:
+                index = (sumRewards[arm] / pulls[arm]) + np.sqrt((2 * np.log(t)) / pulls[arm])
+            if index > bestIndex:
+                bestIndex = index
+                candidates[0] = arm
+                nbMax = 1
+            elif index == bestIndex:
+                candidates[nbMax] = arm
+                nbMax += 1
+        # Uniform choice among the best arms
+        choice = candidates[np.random.randint(nbMax)]
+        reward = allrewards[choice, i]
+        choices[i] = choice
+        rewards[i] = reward
+        t += 1
+        pulls[choice] += 1
+        sumRewards[choice] += (reward - lower) / amplitude
+
+if USE_NUMBA_PLAY:
+    _jitted_ucb_play = numba_jit(_jitted_ucb_play, nopython=True, cache=True)
+
+
 def delayed_play(env, policy, horizon,
                  random_shuffle=random_shuffle, random_invert=random_invert, nb_random_events=nb_random_events,
                  seed=None, allrewards=None, repeatId=0,
-                 useJoblib=False):
+                 useJoblib=False, copy_policy=True, rewards_mm=None, choices_mm=None):
     """Helper function for the parallelization."""
     start_time = time.time()
     start_memory = getCurrentMemory(thread=useJoblib)
@@ -772,52 +907,85 @@ def delayed_play(env, policy, horizon,
     if seed is not None:
         random.seed(seed)
         np.random.seed(seed)
-    # We have to deepcopy because this function is Parallel-ized
+    # We have to copy because this function is Parallel-ized
     if random_shuffle or random_invert:
-        env = deepcopy(env)    # XXX this uses a LOT of RAM memory!!!
+        # A shallow copy is enough: new_order_of_arm() only rebinds arms/means/maxArm/minArm on the copy, the arm objects themselves are never mutated
+        env = copy(env)
     means = env.means
     if env.isDynamic:
         means = env.newRandomArms()
-    policy = deepcopy(policy)  # XXX this uses a LOT of RAM memory!!!
+    if copy_policy:  # the caller can pass a throwaway private copy (e.g. freshly unpickled in a joblib worker) and skip this
+        policy = deepcopy(policy)  # XXX this uses a LOT of RAM memory!!!
 
-    indexes_bestarm = np.nonzero(np.isclose(env.means, env.maxArm))[0]
+    indexes_bestarm = np.flatnonzero(env.means >= env.maxArm - 1e-12)  # one compare, no isclose intermediates
 
     # Start game
     policy.startGame()
     result = Result(env.nbArms, horizon, indexes_bestarm=indexes_bestarm, means=means)  # One Result object, for every policy
 
     # XXX Experimental support for random events: shuffling or inverting the list of arms, at these time steps
-    t_events = [i * int(horizon / float(nb_random_events)) for i in range(nb_random_events)]
     if nb_random_events is None or nb_random_events <= 0:
         random_shuffle = False
         random_invert = False
-
-    prettyRange = tqdm(range(horizon), desc="Time t") if repeatId == 0 else range(horizon)
-    for t in prettyRange:
-        choice = policy.choice()
-
-        if allrewards is None:
-            reward = env.draw(choice, t)
-        else:
-            reward = allrewards[choice, repeatId, t]
-
-        policy.getReward(choice, reward)
-
-        # Finally we store the results
-        result.store(t, choice, reward)
-
-        # XXX Experimental : shuffle the arms at the middle of the simulation
-        if random_shuffle and t in t_events:
-                indexes_bestarm = env.new_order_of_arm(shuffled(env.arms))
-                result.change_in_arms(t, indexes_bestarm)
-                if repeatId == 0:
-                    print("\nShuffling the arms at time t = {} ...".format(t))  # DEBUG
-        # XXX Experimental : invert the order of the arms at the middle of the simulation
-        if random_invert and t in t_events:
-                indexes_bestarm = env.new_order_of_arm(env.arms[::-1])
-                result.change_in_arms(t, indexes_bestarm)
-                if repeatId == 0:
-                    print("\nInverting the order of the arms at time t = {} ...".format(t))  # DEBUG
+    if random_shuffle or random_invert:
+        # The events occur at the nb_random_events multiples of this period: O(1) modulo test at each step, instead of a linear scan of a list of times
+        period_events = int(horizon / float(nb_random_events))
+        last_t_event = (nb_random_events - 1) * period_events
+        if period_events <= 0:  # more events than time steps, they all collapse on t = 0
+            period_events, last_t_event = 1, 0
+
+    # Pre-draw all the rewards of this repetition at once, when the environment allows it:
+    # one vectorized call to the PRNG per arm instead of horizon scalar arm.draw(t) calls
+    drawn_rewards = None
+    if allrewards is None and not (random_shuffle or random_invert) \
+            and not env.isDynamic and not env.isMarkovian and not isinstance(env, IncreasingMAB) \
+            and all(hasattr(arm, 'draw_nparray') for arm in env.arms):
+        drawn_rewards = np.array([arm.draw_nparray((horizon,)) for arm in env.arms])
+
+    # XXX Experimental fast path: a pure UCB policy playing against pre-computed rewards, with no random
+    # events, can run its whole time loop as one numba-compiled kernel instead of horizon Python-level steps
+    if USE_NUMBA_PLAY and (allrewards is not None or drawn_rewards is not None) \
+            and not random_shuffle and not random_invert \
+            and policy.__class__.__name__ == "UCB":
+        sumRewards = np.zeros(env.nbArms)
+        _jitted_ucb_play(allrewards[:, repeatId, :] if allrewards is not None else drawn_rewards, result.choices, result.rewards, policy.pulls, sumRewards, horizon, env.nbArms, policy.lower, policy.amplitude, seed if seed is not None else -1)
+        result.pulls[:] = policy.pulls
+        # Rewrite the final internal state of the policy, eg. for estimatedOrder() below
+        policy.rewards[:] = sumRewards
+        policy.t = horizon
+    else:
+        prettyRange = tqdm(range(horizon), desc="Time t") if repeatId == 0 else range(horizon)
+        # Local references to the result arrays: calling result.store() would cost one Python method call per time step
+        choices, rewards, pulls = result.choices, result.rewards, result.pulls
+        for t in prettyRange:
+            choice = policy.choice()
+
+            if allrewards is not None:
+                reward = allrewards[choice, repeatId, t]
+            elif drawn_rewards is not None:
+                reward = drawn_rewards[choice, t]
+            else:
+                reward = env.draw(choice, t)
+
+            policy.getReward(choice, reward)
+
+            # Finally we store the results, inlined from result.store(t, choice, reward)
+            choices[t] = choice
+            rewards[t] = reward
+            pulls[choice] += 1
+
+            # XXX Experimental : shuffle the arms at the middle of the simulation
+            if random_shuffle and t % period_events == 0 and t <= last_t_event:
+                    indexes_bestarm = env.new_order_of_arm(shuffled(env.arms))
+                    result.change_in_arms(t, indexes_bestarm)
+                    if repeatId == 0:
+                        print("\nShuffling the arms at time t = {} ...".format(t))  # DEBUG
+            # XXX Experimental : invert the order of the arms at the middle of the simulation
+            if random_invert and t % period_events == 0 and t <= last_t_event:
+                    indexes_bestarm = env.new_order_of_arm(env.arms[::-1])
+                    result.change_in_arms(t, indexes_bestarm)
+                    if repeatId == 0:
+                        print("\nInverting the order of the arms at time t = {} ...".format(t))  # DEBUG
 
     # Print the quality of estimation of arm ranking for this policy, just for 1st repetition
     if repeatId == 0 and hasattr(policy, 'estimatedOrder'):
@@ -830,12 +998,33 @@ def delayed_play(env, policy, horizon,
         # print("  ==> Gestalt     distance from optimal ordering: {:.2%} (relative success)...".format(gestalt(order)))
         print("  ==> Mean distance from optimal ordering: {:.2%} (relative success)...".format(meanDistance(order)))
 
+    # When shared memory-mapped buffers are given, write the vectors there and don't ship them back through pickle
+    if rewards_mm is not None:
+        rewards_mm[repeatId, :] = result.rewards
+        choices_mm[repeatId, :] = result.choices
+        result.rewards = result.choices = None  # the parent re-attaches the memmap rows
+
     # Finally, store running time and consumed memory
     result.running_time = time.time() - start_time
     result.memory_consumption = getCurrentMemory(thread=useJoblib) - start_memory
     return result
 
 
+def delayed_play_batch(env, policy, horizon,
+                       random_shuffle=random_shuffle, random_invert=random_invert, nb_random_events=nb_random_events,
+                       seeds=None, allrewards=None, repeatIds=(0,),
+                       useJoblib=False, rewards_mm=None, choices_mm=None):
+    """Helper function for the parallelization: run a whole batch of repetitions in one joblib task.
+
+    - Dispatching one task per batch instead of one per repetition amortizes the serialization cost of ``env`` and ``policy`` over all the repetitions of the batch.
+    - The last repetition of the batch plays directly with the policy unpickled in this worker (a throwaway private copy that is not reused afterwards), saving one deepcopy per batch.
+    """
+    return [
+        delayed_play(env, policy, horizon, random_shuffle=random_shuffle, random_invert=random_invert, nb_random_events=nb_random_events, seed=None if seeds is None else int(seeds[i]), allrewards=allrewards, repeatId=repeatId, useJoblib=useJoblib, copy_policy=(i < len(repeatIds) - 1), rewards_mm=rewards_mm, choices_mm=choices_mm)
+        for i, repeatId in enumerate(repeatIds)
+    ]
+
+
 # --- Helper for loading a previous Evaluator object
 
 def EvaluatorFromDisk(filepath='/tmp/saveondiskEvaluator.hdf5'):
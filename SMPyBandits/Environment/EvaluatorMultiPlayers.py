@@ -934,10 +934,11 @@ class EvaluatorMultiPlayers(object):
         assert 0 < self.averageOn < 1, "Error, the parameter averageOn of a EvaluatorMultiPlayers class has to be in (0, 1) strictly, but is = {} here ...".format(self.averageOn)  # DEBUG
         if verb: print("\nFinal ranking for this environment #{:>2} : {} ...".format(envId, self.strPlayers(latex=False, short=True)))  # DEBUG
         lastY = np.zeros(self.nbPlayers)
+        window = max(1, int(self.averageOn * self.horizon))
         for playerId, player in enumerate(self.players):
             Y = self.getRewards(playerId, envId)
             if self.finalRanksOnAverage:
-                lastY[playerId] = np.mean(Y[-int(self.averageOn * self.horizon)])   # get average value during the last averageOn% of the iterations
+                lastY[playerId] = np.mean(Y[-window:])   # get average value during the last averageOn% of the iterations
             else:
                 lastY[playerId] = Y[-1]  # get the last value
         # Sort lastY and give ranking
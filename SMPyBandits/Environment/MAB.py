@@ -110,7 +110,7 @@ class MAB(object):
         self.means = np.array([arm.mean for arm in self.arms])
         self.maxArm = np.max(self.means)
         self.minArm = np.min(self.means)
-        return np.nonzero(np.isclose(self.means, self.maxArm))[0]
+        return np.flatnonzero(self.means >= self.maxArm - 1e-12)
 
     def __repr__(self):
         return "{}(nbArms: {}, arms: {}, minArm: {:.3g}, maxArm: {:.3g})".format(self.__class__.__name__, self.nbArms, self.arms, self.minArm, self.maxArm)
@@ -614,6 +614,10 @@ class DynamicMAB(MAB):
         self.nbArms = len(self._arms)  # useless
         self._t += 1  # new draw!
         self._historyOfMeans.append(one_draw_of_means)
+        # Invalidate the cached averaged statistics, they have to be recomputed from the new history
+        self._cached_means = None
+        self._cached_minArm = None
+        self._cached_maxArm = None
         if verbose or self._verbose:
             print("\n  - Creating a new dynamic set of means = {} for arms: DynamicMAB = {} ...".format(one_draw_of_means, repr(self)))  # DEBUG
             # print("Currently self._t = {} and self._historyOfMeans = {} ...".format(self._t, self._historyOfMeans))  # DEBUG
@@ -630,9 +634,13 @@ class DynamicMAB(MAB):
     def means(self):
         """ Return the list of means of arms for this DynamicMAB: after :math:`x` calls to :meth:`newRandomArms`, the return mean of arm :math:`k` is the mean of the :math:`x` means of that arm.
 
+        - Cached between two calls to :meth:`newRandomArms`: this property is read at every repetition (and by every regret computation), no need to rebuild the whole history array each time.
+
         .. warning:: Highly experimental!
         """
-        return np.mean(np.array(self._historyOfMeans), axis=0)
+        if self._cached_means is None:
+            self._cached_means = np.mean(np.array(self._historyOfMeans), axis=0)
+        return self._cached_means
 
     #
     # --- Helper to compute sets Mbest and Mworst
@@ -649,17 +657,21 @@ class DynamicMAB(MAB):
 
     @property
     def minArm(self):
-        """Return the smallest mean of the arms, for a dynamic MAB (averaged on all the draws of new means)."""
+        """Return the smallest mean of the arms, for a dynamic MAB (averaged on all the draws of new means). Cached, like :attr:`means`."""
         # XXX equivalent to np.mean(np.min(means) for means in ...) ? NOPE
         # return np.min(self.means)
-        return np.mean(np.min(np.array(self._historyOfMeans)))
+        if self._cached_minArm is None:
+            self._cached_minArm = np.mean(np.min(np.array(self._historyOfMeans)))
+        return self._cached_minArm
 
     @property
     def maxArm(self):
-        """Return the largest mean of the arms, for a dynamic MAB (averaged on all the draws of new means)."""
+        """Return the largest mean of the arms, for a dynamic MAB (averaged on all the draws of new means). Cached, like :attr:`means`."""
         # XXX equivalent to np.mean(np.max(means) for means in ...) ? NOPE
         # return np.max(self.means)
-        return np.mean(np.max(np.array(self._historyOfMeans)))
+        if self._cached_maxArm is None:
+            self._cached_maxArm = np.mean(np.max(np.array(self._historyOfMeans)))
+        return self._cached_maxArm
 
     #
     # --- Compute lower bounds
@@ -20,7 +20,7 @@ class Result(object):
         self.rewards = np.zeros(horizon)  #: Store all the rewards, to compute the mean
         self.pulls = np.zeros(nbArms, dtype=int)  #: Store the pulls
         if means is not None:
-            indexes_bestarm = np.nonzero(np.isclose(means, np.max(means)))[0]
+            indexes_bestarm = np.flatnonzero(means >= np.max(means) - 1e-12)
         indexes_bestarm = np.asarray(indexes_bestarm)
         if np.size(indexes_bestarm) == 1:
             indexes_bestarm = np.asarray([indexes_bestarm])
@@ -9,6 +9,7 @@ from __future__ import division, print_function  # Python 2 compatibility
 __author__ = "Lilian Besson"
 __version__ = "0.9"
 
+from functools import lru_cache
 from textwrap import wrap
 from os.path import getsize, getatime
 
@@ -74,9 +75,20 @@ if __name__ != '__main__':
     # fig.close()
 
 
+@lru_cache(maxsize=None)
+def _palette(nb, hls, viridis):
+    """ Memoized helper for :func:`palette`: build the palette once per ``(nb, hls, viridis)``."""
+    if viridis:
+        return sns.color_palette('viridis', nb)
+    else:
+        return sns.hls_palette(nb + 1)[:nb] if hls else sns.husl_palette(nb + 1)[:nb]
+
+
 def palette(nb, hls=HLS, viridis=VIRIDIS):
     """ Use a smart palette from seaborn, for nb different plots on the same figure.
 
+    - The result is memoized (in :func:`_palette`), but a fresh list is returned on every call, so callers can freely modify their copy (some replace a color) without corrupting the cache.
+
     - Ref: http://seaborn.pydata.org/generated/seaborn.hls_palette.html#seaborn.hls_palette
 
     >>> palette(10, hls=True)  # doctest: +ELLIPSIS
@@ -92,10 +104,15 @@ def palette(nb, hls=HLS, viridis=VIRIDIS):
     >>> sns.palplot(palette(10, hls=False))  # use HUSL by default  # doctest: +SKIP
     >>> sns.palplot(palette(10, viridis=True))  # doctest: +SKIP
     """
-    if viridis:
-        return sns.color_palette('viridis', nb)
-    else:
-        return sns.hls_palette(nb + 1)[:nb] if hls else sns.husl_palette(nb + 1)[:nb]
+    return list(_palette(nb, hls, viridis))
+
+
+@lru_cache(maxsize=None)
+def _makemarkers(nb):
+    """ Memoized helper for :func:`makemarkers`: build the list of markers once per ``nb``."""
+    allmarkers = ['o', 'D', 'v', 'p', '<', 's', '^', '*', 'h', '>']
+    longlist = allmarkers * (1 + int(nb / float(len(allmarkers))))  # Cycle the good number of time
+    return longlist[:nb]  # Truncate
 
 
 def makemarkers(nb):
@@ -103,6 +120,8 @@ def makemarkers(nb):
 
     .. note:: This what I consider the *optimal* sequence of markers, they are clearly differentiable one from another and all are pretty.
 
+    - The result is memoized (in :func:`_makemarkers`), but a fresh list is returned on every call, like :func:`palette`.
+
     Examples:
 
     >>> makemarkers(7)
@@ -110,9 +129,7 @@ def makemarkers(nb):
     >>> makemarkers(12)
     ['o', 'D', 'v', 'p', '<', 's', '^', '*', 'h', '>', 'o', 'D']
     """
-    allmarkers = ['o', 'D', 'v', 'p', '<', 's', '^', '*', 'h', '>']
-    longlist = allmarkers * (1 + int(nb / float(len(allmarkers))))  # Cycle the good number of time
-    return longlist[:nb]  # Truncate
+    return list(_makemarkers(nb))
 
 
 #: Default parameter for legend(): if True, the legend is placed at the right side of the figure, not on it.
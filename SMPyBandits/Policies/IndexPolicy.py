@@ -51,17 +51,20 @@ class IndexPolicy(BasePolicy):
 
         .. math:: A(t) \sim U(\arg\max_{1 \leq k \leq K} I_k(t)).
 
-        .. warning:: In almost all cases, there is a unique arm with maximal index, so we lose a lot of time with this generic code, but I couldn't find a way to be more efficient without loosing generality.
+        .. note:: In almost all cases, there is a unique arm with maximal index, so the fast path below only pays one argmax and one equality test; the generic uniform tie-breaking (which needs a nonzero and a call to the RNG) is kept for the rare draws.
         """
         # I prefer to let this be another method, so child of IndexPolicy only needs to implement it (if they want, or just computeIndex)
         self.computeAllIndex()
-        # Uniform choice among the best arms
-        try:
-            return np.random.choice(np.nonzero(self.index == np.max(self.index))[0])
-        except ValueError:
+        best = self.index.argmax()
+        bestIndex = self.index[best]
+        if np.isnan(bestIndex):  # argmax propagates NaN, like np.max did
             if not np.all(np.isnan(self.index)):
                 raise ValueError("Error: unknown error in IndexPolicy.choice(): the indexes were {} but couldn't be used to select an arm.".format(self.index))
             return np.random.randint(self.nbArms)
+        if np.count_nonzero(self.index == bestIndex) == 1:
+            return best
+        # Uniform choice among the best arms
+        return np.random.choice(np.nonzero(self.index == bestIndex)[0])
 
     # --- Others choice...() methods
 
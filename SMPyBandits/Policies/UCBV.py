@@ -57,8 +57,9 @@ class UCBV(UCB):
 
     def computeAllIndex(self):
         """ Compute the current indexes for all arms, in a vectorized manner."""
+        logt = np.log(self.t)  # compute it only once
         means = self.rewards / self.pulls   # Mean estimate
         variances = (self.rewardsSquared / self.pulls) - means ** 2  # Variance estimate
-        indexes = means + np.sqrt(2.0 * np.log(self.t) * variances / self.pulls) + 3.0 * self.amplitude * np.log(self.t) / self.pulls
+        indexes = means + np.sqrt(2.0 * logt * variances / self.pulls) + 3.0 * self.amplitude * logt / self.pulls
         indexes[self.pulls < 1] = float('+inf')
         self.index[:] = indexes
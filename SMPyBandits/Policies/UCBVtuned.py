@@ -47,9 +47,10 @@ class UCBVtuned(UCBV):
 
     def computeAllIndex(self):
         """ Compute the current indexes for all arms, in a vectorized manner."""
+        logt = np.log(self.t)  # compute it only once
         means = self.rewards / self.pulls   # Mean estimate
         variances = (self.rewardsSquared / self.pulls) - means ** 2  # Variance estimate
-        variances += np.sqrt(2.0 * np.log(self.t) / self.pulls)
-        indexes = means + np.sqrt(np.log(self.t) * variances / self.pulls)
+        variances += np.sqrt(2.0 * logt / self.pulls)
+        indexes = means + np.sqrt(logt * variances / self.pulls)
         indexes[self.pulls < 1] = float('+inf')
         self.index[:] = indexes
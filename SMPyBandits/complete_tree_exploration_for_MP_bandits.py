@@ -44,7 +44,7 @@ from __future__ import division, print_function  # Python 2 compatibility
 __author__ = "Lilian Besson"
 __version__ = "0.7"
 
-from collections import Counter, deque
+from collections import deque
 from fractions import Fraction
 from itertools import product
 from os import getenv, chdir, getcwd
@@ -122,12 +122,277 @@ CONCISE = True  #: By default, only show :math:`\tilde{S}` and :math:`N` in the
 CONCISE = mybool(getenv('CONCISE', CONCISE))
 
 FULLHASH = not CONCISE  #: Use only Stilde, N for hashing the states.
+
+VERBOSE = False  #: By default, don't print every explored node: formatting a multi-line string per node costs more than exploring it.
+VERBOSE = mybool(getenv('VERBOSE', VERBOSE))
 FULLHASH = mybool(getenv('FULLHASH', FULLHASH))
 
 # FORMAT = "pdf"  #: Format used to save the graphs.
 FORMAT = "svg"  #: Format used to save the graphs.
 FORMAT = getenv("FORMAT", FORMAT)
 
+# --- Compiled index kernels
+
+# The Selfish_* and RhoRand_* policies below only do a handful of element-wise operations on tiny length-K arrays (K <= 10), where the per-call overhead of numpy dominates the actual arithmetic.
+# So the index computations are written as scalar loops and compiled with numba when it is available; otherwise the equivalent numpy expressions are used.
+try:
+    from numba import njit as _njit
+
+    @_njit(cache=True)
+    def _greedy_indexes(numerator, invN):
+        """0-Greedy indexes ``numerator / N``, and :math:`+\infty` for arms not sampled yet (compiled scalar loop, multiplying by the cached ``1/N``)."""
+        indexes = np.empty(invN.shape[0])
+        for i in range(invN.shape[0]):
+            indexes[i] = np.inf if invN[i] == 0. else numerator[i] * invN[i]
+        return indexes
+
+    @_njit(cache=True)
+    def _greedy_bar_indexes(S, invN, Ntilde):
+        """0-Greedy indexes ``(Ntilde / N) * (S / N)``, and :math:`+\infty` for arms not sampled yet (compiled scalar loop, multiplying by the cached ``1/N``)."""
+        indexes = np.empty(invN.shape[0])
+        for i in range(invN.shape[0]):
+            indexes[i] = np.inf if invN[i] == 0. else (Ntilde[i] * invN[i]) * (S[i] * invN[i])
+        return indexes
+
+    @_njit(cache=True)
+    def _ucb_indexes(numerator, invN, explo):
+        """UCB indexes ``numerator / N + sqrt(explo / N)`` with ``explo = alpha * log(t)``, and :math:`+\infty` for arms not sampled yet (compiled scalar loop, multiplying by the cached ``1/N``)."""
+        indexes = np.empty(invN.shape[0])
+        for i in range(invN.shape[0]):
+            indexes[i] = np.inf if invN[i] == 0. else numerator[i] * invN[i] + np.sqrt(explo * invN[i])
+        return indexes
+
+    @_njit(cache=True)
+    def _ucb_bar_indexes(S, invN, Ntilde, explo):
+        """UCB indexes ``(Ntilde / N) * (S / N) + sqrt(explo / N)``, and :math:`+\infty` for arms not sampled yet (compiled scalar loop, multiplying by the cached ``1/N``)."""
+        indexes = np.empty(invN.shape[0])
+        for i in range(invN.shape[0]):
+            indexes[i] = np.inf if invN[i] == 0. else (Ntilde[i] * invN[i]) * (S[i] * invN[i]) + np.sqrt(explo * invN[i])
+        return indexes
+
+    @_njit(cache=True)
+    def _klBern(x, y):
+        """Bernoulli KL divergence, same formula and truncation as :func:`Policies.kullback.klBern` (compiled)."""
+        x = min(max(x, 1e-15), 1 - 1e-15)
+        y = min(max(y, 1e-15), 1 - 1e-15)
+        return x * np.log(x / y) + (1 - x) * np.log((1 - x) / (1 - y))
+
+    @_njit(cache=True)
+    def _klucbBern(x, d, precision):
+        """Bernoulli KL-UCB index, same algorithm as :func:`Policies.kullback.klucbBern` (compiled): a Gaussian upper bound then a bisection search on :func:`_klBern`."""
+        value = x
+        u = min(1., x + np.sqrt(d / 2.))  # klucbGauss upper bound, variance 1/4 for [0,1] bounded distributions
+        _count_iteration = 0
+        while _count_iteration < 50 and u - value > precision:
+            _count_iteration += 1
+            m = (value + u) / 2.
+            if _klBern(x, m) > d:
+                u = m
+            else:
+                value = m
+        return (value + u) / 2.
+
+    @_njit(cache=True)
+    def _klucb_indexes(numerator, invN, explo):
+        """KL-UCB indexes ``klucbBern(numerator / N, explo / N)`` with ``explo = c * log(t)``, and :math:`+\infty` for arms not sampled yet (compiled scalar loop, multiplying by the cached ``1/N``)."""
+        indexes = np.empty(invN.shape[0])
+        for i in range(invN.shape[0]):
+            indexes[i] = np.inf if invN[i] == 0. else _klucbBern(numerator[i] * invN[i], explo * invN[i], tolerance)
+        return indexes
+
+    @_njit(cache=True)
+    def _klucb_bar_indexes(S, invN, Ntilde, explo):
+        """KL-UCB indexes ``klucbBern((Ntilde / N) * (S / N), explo / N)``, and :math:`+\infty` for arms not sampled yet (compiled scalar loop, multiplying by the cached ``1/N``)."""
+        indexes = np.empty(invN.shape[0])
+        for i in range(invN.shape[0]):
+            indexes[i] = np.inf if invN[i] == 0. else _klucbBern((Ntilde[i] * invN[i]) * (S[i] * invN[i]), explo * invN[i], tolerance)
+        return indexes
+
+    @_njit(cache=True)
+    def _argmax_ties(indexes):
+        """Positions attaining the maximum of ``indexes``, as one compiled scan (a single pass and a single small allocation, instead of the ``np.max`` pass plus the ``np.where`` pass with its boolean mask)."""
+        out = np.empty(indexes.shape[0], np.intp)
+        best = indexes[0]
+        out[0] = 0
+        count = 1
+        for i in range(1, indexes.shape[0]):
+            if indexes[i] > best:
+                best = indexes[i]
+                out[0] = i
+                count = 1
+            elif indexes[i] == best:
+                out[count] = i
+                count += 1
+        return out[:count]
+
+    # The Selfish_* policies only need the positions of the maximal index, so the index computation and the argmax-with-ties scan are fused in one compiled pass, without even the intermediate index array.
+
+    @_njit(cache=True)
+    def _greedy_choices(numerator, invN):
+        """Positions of the maximal 0-Greedy index, fused compute + argmax-with-ties in one compiled pass."""
+        out = np.empty(invN.shape[0], np.intp)
+        best = -np.inf
+        count = 0
+        for i in range(invN.shape[0]):
+            index = np.inf if invN[i] == 0. else numerator[i] * invN[i]
+            if index > best:
+                best = index
+                out[0] = i
+                count = 1
+            elif index == best:
+                out[count] = i
+                count += 1
+        return out[:count]
+
+    @_njit(cache=True)
+    def _greedy_bar_choices(S, invN, Ntilde):
+        """Positions of the maximal 0-Greedy Ubar index, fused compute + argmax-with-ties in one compiled pass."""
+        out = np.empty(invN.shape[0], np.intp)
+        best = -np.inf
+        count = 0
+        for i in range(invN.shape[0]):
+            index = np.inf if invN[i] == 0. else (Ntilde[i] * invN[i]) * (S[i] * invN[i])
+            if index > best:
+                best = index
+                out[0] = i
+                count = 1
+            elif index == best:
+                out[count] = i
+                count += 1
+        return out[:count]
+
+    @_njit(cache=True)
+    def _ucb_choices(numerator, invN, explo):
+        """Positions of the maximal UCB index, fused compute + argmax-with-ties in one compiled pass."""
+        out = np.empty(invN.shape[0], np.intp)
+        best = -np.inf
+        count = 0
+        for i in range(invN.shape[0]):
+            index = np.inf if invN[i] == 0. else numerator[i] * invN[i] + np.sqrt(explo * invN[i])
+            if index > best:
+                best = index
+                out[0] = i
+                count = 1
+            elif index == best:
+                out[count] = i
+                count += 1
+        return out[:count]
+
+    @_njit(cache=True)
+    def _ucb_bar_choices(S, invN, Ntilde, explo):
+        """Positions of the maximal UCB Ubar index, fused compute + argmax-with-ties in one compiled pass."""
+        out = np.empty(invN.shape[0], np.intp)
+        best = -np.inf
+        count = 0
+        for i in range(invN.shape[0]):
+            index = np.inf if invN[i] == 0. else (Ntilde[i] * invN[i]) * (S[i] * invN[i]) + np.sqrt(explo * invN[i])
+            if index > best:
+                best = index
+                out[0] = i
+                count = 1
+            elif index == best:
+                out[count] = i
+                count += 1
+        return out[:count]
+
+    @_njit(cache=True)
+    def _klucb_choices(numerator, invN, explo):
+        """Positions of the maximal KL-UCB index, fused compute + argmax-with-ties in one compiled pass."""
+        out = np.empty(invN.shape[0], np.intp)
+        best = -np.inf
+        count = 0
+        for i in range(invN.shape[0]):
+            index = np.inf if invN[i] == 0. else _klucbBern(numerator[i] * invN[i], explo * invN[i], tolerance)
+            if index > best:
+                best = index
+                out[0] = i
+                count = 1
+            elif index == best:
+                out[count] = i
+                count += 1
+        return out[:count]
+
+    @_njit(cache=True)
+    def _klucb_bar_choices(S, invN, Ntilde, explo):
+        """Positions of the maximal KL-UCB Ubar index, fused compute + argmax-with-ties in one compiled pass."""
+        out = np.empty(invN.shape[0], np.intp)
+        best = -np.inf
+        count = 0
+        for i in range(invN.shape[0]):
+            index = np.inf if invN[i] == 0. else _klucbBern((Ntilde[i] * invN[i]) * (S[i] * invN[i]), explo * invN[i], tolerance)
+            if index > best:
+                best = index
+                out[0] = i
+                count = 1
+            elif index == best:
+                out[count] = i
+                count += 1
+        return out[:count]
+
+except ImportError:
+    def _greedy_indexes(numerator, invN):
+        """0-Greedy indexes ``numerator / N``, and :math:`+\infty` for arms not sampled yet (numpy fallback, numba is not available)."""
+        indexes = numerator * invN
+        indexes[invN == 0.] = +oo
+        return indexes
+
+    def _greedy_bar_indexes(S, invN, Ntilde):
+        """0-Greedy indexes ``(Ntilde / N) * (S / N)``, and :math:`+\infty` for arms not sampled yet (numpy fallback, numba is not available)."""
+        indexes = (Ntilde * invN) * (S * invN)
+        indexes[invN == 0.] = +oo
+        return indexes
+
+    def _ucb_indexes(numerator, invN, explo):
+        """UCB indexes ``numerator / N + sqrt(explo / N)`` with ``explo = alpha * log(t)``, and :math:`+\infty` for arms not sampled yet (numpy fallback, numba is not available)."""
+        indexes = (numerator * invN) + np.sqrt(explo * invN)
+        indexes[invN == 0.] = +oo
+        return indexes
+
+    def _ucb_bar_indexes(S, invN, Ntilde, explo):
+        """UCB indexes ``(Ntilde / N) * (S / N) + sqrt(explo / N)``, and :math:`+\infty` for arms not sampled yet (numpy fallback, numba is not available)."""
+        indexes = (Ntilde * invN) * (S * invN) + np.sqrt(explo * invN)
+        indexes[invN == 0.] = +oo
+        return indexes
+
+    def _klucb_indexes(numerator, invN, explo):
+        """KL-UCB indexes ``klucbBern(numerator / N, explo / N)``, and :math:`+\infty` for arms not sampled yet (Python fallback, numba is not available: a plain list comprehension, with none of the dispatch overhead of ``np.vectorize``)."""
+        indexes = np.array([ +oo if inv == 0. else klucbBern(s * inv, explo * inv, tolerance) for s, inv in zip(numerator, invN) ])
+        return indexes
+
+    def _klucb_bar_indexes(S, invN, Ntilde, explo):
+        """KL-UCB indexes ``klucbBern((Ntilde / N) * (S / N), explo / N)``, and :math:`+\infty` for arms not sampled yet (Python fallback, numba is not available)."""
+        indexes = np.array([ +oo if inv == 0. else klucbBern((nt * inv) * (s * inv), explo * inv, tolerance) for s, inv, nt in zip(S, invN, Ntilde) ])
+        return indexes
+
+    def _argmax_ties(indexes):
+        """Positions attaining the maximum of ``indexes`` (numpy fallback, numba is not available)."""
+        return np.where(indexes == np.max(indexes))[0]
+
+    def _greedy_choices(numerator, invN):
+        """Positions of the maximal 0-Greedy index (numpy fallback, numba is not available)."""
+        return _argmax_ties(_greedy_indexes(numerator, invN))
+
+    def _greedy_bar_choices(S, invN, Ntilde):
+        """Positions of the maximal 0-Greedy Ubar index (numpy fallback, numba is not available)."""
+        return _argmax_ties(_greedy_bar_indexes(S, invN, Ntilde))
+
+    def _ucb_choices(numerator, invN, explo):
+        """Positions of the maximal UCB index (numpy fallback, numba is not available)."""
+        return _argmax_ties(_ucb_indexes(numerator, invN, explo))
+
+    def _ucb_bar_choices(S, invN, Ntilde, explo):
+        """Positions of the maximal UCB Ubar index (numpy fallback, numba is not available)."""
+        return _argmax_ties(_ucb_bar_indexes(S, invN, Ntilde, explo))
+
+    def _klucb_choices(numerator, invN, explo):
+        """Positions of the maximal KL-UCB index (numpy fallback, numba is not available)."""
+        return _argmax_ties(_klucb_indexes(numerator, invN, explo))
+
+    def _klucb_bar_choices(S, invN, Ntilde, explo):
+        """Positions of the maximal KL-UCB Ubar index (numpy fallback, numba is not available)."""
+        return _argmax_ties(_klucb_bar_indexes(S, invN, Ntilde, explo))
+
+
 # --- Implement the bandit algorithms in a purely functional and memory-less flavor
 
 @jit
@@ -147,31 +412,25 @@ def ConstantRank(j, state, decision, collision):
 
 @jit
 def choices_from_indexes(indexes):
-    """For deterministic index policies, if more than one index is maximum, return the list of positions attaining this maximum (ties), or only one position."""
-    return np.where(indexes == np.max(indexes))[0]
+    """For deterministic index policies, if more than one index is maximum, return the list of positions attaining this maximum (ties), or only one position (one compiled scan, see :func:`_argmax_ties`)."""
+    return _argmax_ties(indexes)
 
 # --- Selfish 0-greedy variants
 
 @jit
 def Selfish_0Greedy_U(j, state):
     """Selfish policy + 0-Greedy index + U feedback."""
-    indexes = state.S[j] / state.N[j]
-    indexes[state.N[j] < 1] = +oo
-    return choices_from_indexes(indexes)
+    return _greedy_choices(state.S[j], state.inv_N[j])
 
 @jit
 def Selfish_0Greedy_Utilde(j, state):
     """Selfish policy + 0-Greedy index + Utilde feedback."""
-    indexes = state.Stilde[j] / state.N[j]
-    indexes[state.N[j] < 1] = +oo
-    return choices_from_indexes(indexes)
+    return _greedy_choices(state.Stilde[j], state.inv_N[j])
 
 @jit
 def Selfish_0Greedy_Ubar(j, state):
     """Selfish policy + 0-Greedy index + Ubar feedback."""
-    indexes = (state.Ntilde[j] / state.N[j]) * (state.S[j] / state.N[j])
-    indexes[state.N[j] < 1] = +oo
-    return choices_from_indexes(indexes)
+    return _greedy_bar_choices(state.S[j], state.inv_N[j], state.Ntilde[j])
 
 default_policy = Selfish_0Greedy_Ubar
 
@@ -182,25 +441,19 @@ alpha = 0.5
 @jit
 def Selfish_UCB_U(j, state):
     """Selfish policy + UCB_0.5 index + U feedback."""
-    indexes = (state.S[j] / state.N[j]) + np.sqrt(alpha * np.log(state.t) / state.N[j])
-    indexes[state.N[j] < 1] = +oo
-    return choices_from_indexes(indexes)
+    return _ucb_choices(state.S[j], state.inv_N[j], alpha * state.log_t)
 
 @jit
 def Selfish_UCB(j, state):
     """Selfish policy + UCB_0.5 index + Utilde feedback."""
-    indexes = (state.Stilde[j] / state.N[j]) + np.sqrt(alpha * np.log(state.t) / state.N[j])
-    indexes[state.N[j] < 1] = +oo
-    return choices_from_indexes(indexes)
+    return _ucb_choices(state.Stilde[j], state.inv_N[j], alpha * state.log_t)
 
 Selfish_UCB_Utilde = Selfish_UCB
 
 @jit
 def Selfish_UCB_Ubar(j, state):
     """Selfish policy + UCB_0.5 index + Ubar feedback."""
-    indexes = (state.Ntilde[j] / state.N[j]) * (state.S[j] / state.N[j]) + np.sqrt(alpha * np.log(state.t) / state.N[j])
-    indexes[state.N[j] < 1] = +oo
-    return choices_from_indexes(indexes)
+    return _ucb_bar_choices(state.S[j], state.inv_N[j], state.Ntilde[j], alpha * state.log_t)
 
 # default_policy = Selfish_UCB_Ubar
 
@@ -208,31 +461,24 @@ def Selfish_UCB_Ubar(j, state):
 
 from Policies import klucbBern
 tolerance = 1e-6
-klucb = np.vectorize(klucbBern)
 c = 1
 
 @jit
 def Selfish_KLUCB_U(j, state):
     """Selfish policy + Bernoulli KL-UCB index + U feedback."""
-    indexes = klucb(state.S[j] / state.N[j], c * np.log(state.t) / state.N[j], tolerance)
-    indexes[state.N[j] < 1] = +oo
-    return choices_from_indexes(indexes)
+    return _klucb_choices(state.S[j], state.inv_N[j], c * state.log_t)
 
 @jit
 def Selfish_KLUCB(j, state):
     """Selfish policy + Bernoulli KL-UCB index + Utilde feedback."""
-    indexes = klucb(state.Stilde[j] / state.N[j], c * np.log(state.t) / state.N[j], tolerance)
-    indexes[state.N[j] < 1] = +oo
-    return choices_from_indexes(indexes)
+    return _klucb_choices(state.Stilde[j], state.inv_N[j], c * state.log_t)
 
 Selfish_KLUCB_Utilde = Selfish_KLUCB
 
 @jit
 def Selfish_KLUCB_Ubar(j, state):
     """Selfish policy + Bernoulli KL-UCB index + Ubar feedback."""
-    indexes = klucb((state.Ntilde[j] / state.N[j]) * (state.S[j] / state.N[j]), c * np.log(state.t) / state.N[j], tolerance)
-    indexes[state.N[j] < 1] = +oo
-    return choices_from_indexes(indexes)
+    return _klucb_bar_choices(state.S[j], state.inv_N[j], state.Ntilde[j], c * state.log_t)
 
 # default_policy = Selfish_KLUCB_Ubar
 
@@ -250,48 +496,42 @@ alpha = 0.5
 def RhoRand_UCB_U(j, state):
     """RhoRand policy + UCB_0.5 index + U feedback."""
     rank = state.memories[j]
-    indexes = (state.S[j] / state.N[j]) + np.sqrt(alpha * np.log(state.t) / state.N[j])
-    indexes[state.N[j] < 1] = +oo
+    indexes = _ucb_indexes(state.S[j], state.inv_N[j], alpha * state.log_t)
     return choices_from_indexes_with_rank(indexes, rank=rank)
 
 @jit
 def RhoRand_UCB_Utilde(j, state):
     """RhoRand policy + UCB_0.5 index + Utilde feedback."""
     rank = state.memories[j]
-    indexes = (state.Stilde[j] / state.N[j]) + np.sqrt(alpha * np.log(state.t) / state.N[j])
-    indexes[state.N[j] < 1] = +oo
+    indexes = _ucb_indexes(state.Stilde[j], state.inv_N[j], alpha * state.log_t)
     return choices_from_indexes_with_rank(indexes, rank=rank)
 
 @jit
 def RhoRand_UCB_Ubar(j, state):
     """RhoRand policy + UCB_0.5 index + Ubar feedback."""
     rank = state.memories[j]
-    indexes = (state.Ntilde[j] / state.N[j]) * (state.S[j] / state.N[j]) + np.sqrt(alpha * np.log(state.t) / state.N[j])
-    indexes[state.N[j] < 1] = +oo
+    indexes = _ucb_bar_indexes(state.S[j], state.inv_N[j], state.Ntilde[j], alpha * state.log_t)
     return choices_from_indexes_with_rank(indexes, rank=rank)
 
 @jit
 def RhoRand_KLUCB_U(j, state):
     """RhoRand policy + Bernoulli KL-UCB index + U feedback."""
     rank = state.memories[j]
-    indexes = klucb(state.S[j] / state.N[j], c * np.log(state.t) / state.N[j], tolerance)
-    indexes[state.N[j] < 1] = +oo
+    indexes = _klucb_indexes(state.S[j], state.inv_N[j], c * state.log_t)
     return choices_from_indexes_with_rank(indexes, rank=rank)
 
 @jit
 def RhoRand_KLUCB_Utilde(j, state):
     """RhoRand policy + Bernoulli KL-UCB index + Utilde feedback."""
     rank = state.memories[j]
-    indexes = klucb(state.Stilde[j] / state.N[j], c * np.log(state.t) / state.N[j], tolerance)
-    indexes[state.N[j] < 1] = +oo
+    indexes = _klucb_indexes(state.Stilde[j], state.inv_N[j], c * state.log_t)
     return choices_from_indexes_with_rank(indexes, rank=rank)
 
 @jit
 def RhoRand_KLUCB_Ubar(j, state):
     """RhoRand policy + Bernoulli KL-UCB index + Ubar feedback."""
     rank = state.memories[j]
-    indexes = klucb((state.Ntilde[j] / state.N[j]) * (state.S[j] / state.N[j]), c * np.log(state.t) / state.N[j], tolerance)
-    indexes[state.N[j] < 1] = +oo
+    indexes = _klucb_bar_indexes(state.S[j], state.inv_N[j], state.Ntilde[j], c * state.log_t)
     return choices_from_indexes_with_rank(indexes, rank=rank)
 
 # So we need tow functions: one takes the decision, one updates the rank after all the decisions are taken
@@ -314,8 +554,7 @@ default_policy, default_update_memory = RhoRand_UCB_U, RandomNewRank
 def RandTopM_UCB_U(j, state, collision=False):
     """RandTopM policy + UCB_0.5 index + U feedback."""
     chosen_arm = state.memories[j]
-    indexes = (state.S[j] / state.N[j]) + np.sqrt(alpha * np.log(state.t) / state.N[j])
-    indexes[state.N[j] < 1] = +oo
+    indexes = _ucb_indexes(state.S[j], state.inv_N[j], alpha * state.log_t)
     estimatedBestArms = np.argsort(indexes)[-state.M:]
     if collision or chosen_arm not in estimatedBestArms:
         return estimatedBestArms
@@ -326,8 +565,7 @@ def RandTopM_UCB_U(j, state, collision=False):
 def RandTopM_UCB_Utilde(j, state, collision=False):
     """RandTopM policy + UCB_0.5 index + Utilde feedback."""
     chosen_arm = state.memories[j]
-    indexes = (state.Stilde[j] / state.N[j]) + np.sqrt(alpha * np.log(state.t) / state.N[j])
-    indexes[state.N[j] < 1] = +oo
+    indexes = _ucb_indexes(state.Stilde[j], state.inv_N[j], alpha * state.log_t)
     estimatedBestArms = np.argsort(indexes)[-state.M:]
     if collision or chosen_arm not in estimatedBestArms:
         return estimatedBestArms
@@ -338,8 +576,7 @@ def RandTopM_UCB_Utilde(j, state, collision=False):
 def RandTopM_UCB_Ubar(j, state, collision=False):
     """RandTopM policy + UCB_0.5 index + Ubar feedback."""
     chosen_arm = state.memories[j]
-    indexes = (state.Ntilde[j] / state.N[j]) * (state.S[j] / state.N[j]) + np.sqrt(alpha * np.log(state.t) / state.N[j])
-    indexes[state.N[j] < 1] = +oo
+    indexes = _ucb_bar_indexes(state.S[j], state.inv_N[j], state.Ntilde[j], alpha * state.log_t)
     estimatedBestArms = np.argsort(indexes)[-state.M:]
     if collision or chosen_arm not in estimatedBestArms:
         return estimatedBestArms
@@ -350,8 +587,7 @@ def RandTopM_UCB_Ubar(j, state, collision=False):
 def RandTopM_KLUCB_U(j, state, collision=False):
     """RandTopM policy + Bernoulli KL-UCB index + U feedback."""
     chosen_arm = state.memories[j]
-    indexes = klucb(state.S[j] / state.N[j], c * np.log(state.t) / state.N[j], tolerance)
-    indexes[state.N[j] < 1] = +oo
+    indexes = _klucb_indexes(state.S[j], state.inv_N[j], c * state.log_t)
     estimatedBestArms = np.argsort(indexes)[-state.M:]
     if collision or chosen_arm not in estimatedBestArms:
         return estimatedBestArms
@@ -362,8 +598,7 @@ def RandTopM_KLUCB_U(j, state, collision=False):
 def RandTopM_KLUCB_Utilde(j, state, collision=False):
     """RandTopM policy + Bernoulli KL-UCB index + Utilde feedback."""
     chosen_arm = state.memories[j]
-    indexes = klucb(state.Stilde[j] / state.N[j], c * np.log(state.t) / state.N[j], tolerance)
-    indexes[state.N[j] < 1] = +oo
+    indexes = _klucb_indexes(state.Stilde[j], state.inv_N[j], c * state.log_t)
     estimatedBestArms = np.argsort(indexes)[-state.M:]
     if collision or chosen_arm not in estimatedBestArms:
         return estimatedBestArms
@@ -374,8 +609,7 @@ def RandTopM_KLUCB_Utilde(j, state, collision=False):
 def RandTopM_KLUCB_Ubar(j, state, collision=False):
     """RandTopM policy + Bernoulli KL-UCB index + Ubar feedback."""
     chosen_arm = state.memories[j]
-    indexes = klucb((state.Ntilde[j] / state.N[j]) * (state.S[j] / state.N[j]), c * np.log(state.t) / state.N[j], tolerance)
-    indexes[state.N[j] < 1] = +oo
+    indexes = _klucb_bar_indexes(state.S[j], state.inv_N[j], state.Ntilde[j], c * state.log_t)
     estimatedBestArms = np.argsort(indexes)[-state.M:]
     if collision or chosen_arm not in estimatedBestArms:
         return estimatedBestArms
@@ -408,8 +642,7 @@ def MCTopM_UCB_U(j, state, collision=False):
         state.memories = write_to_tuple(state.memories, j, (-1, False))
     assert isinstance(state.memories[j], tuple)
     chosen_arm, sitted = state.memories[j]
-    indexes = (state.S[j] / state.N[j]) + np.sqrt(alpha * np.log(state.t) / state.N[j])
-    indexes[state.N[j] < 1] = +oo
+    indexes = _ucb_indexes(state.S[j], state.inv_N[j], alpha * state.log_t)
     estimatedBestArms = np.argsort(indexes)[-state.M:]
     if collision or chosen_arm not in estimatedBestArms:
         return estimatedBestArms
@@ -423,8 +656,7 @@ def MCTopM_UCB_Utilde(j, state, collision=False):
         state.memories = write_to_tuple(state.memories, j, (-1, False))
     assert isinstance(state.memories[j], tuple)
     chosen_arm, sitted = state.memories[j]
-    indexes = (state.Stilde[j] / state.N[j]) + np.sqrt(alpha * np.log(state.t) / state.N[j])
-    indexes[state.N[j] < 1] = +oo
+    indexes = _ucb_indexes(state.Stilde[j], state.inv_N[j], alpha * state.log_t)
     estimatedBestArms = np.argsort(indexes)[-state.M:]
     if collision or chosen_arm not in estimatedBestArms:
         return estimatedBestArms
@@ -438,8 +670,7 @@ def MCTopM_UCB_Ubar(j, state, collision=False):
         state.memories = write_to_tuple(state.memories, j, (-1, False))
     assert isinstance(state.memories[j], tuple)
     chosen_arm, sitted = state.memories[j]
-    indexes = (state.Ntilde[j] / state.N[j]) * (state.S[j] / state.N[j]) + np.sqrt(alpha * np.log(state.t) / state.N[j])
-    indexes[state.N[j] < 1] = +oo
+    indexes = _ucb_bar_indexes(state.S[j], state.inv_N[j], state.Ntilde[j], alpha * state.log_t)
     estimatedBestArms = np.argsort(indexes)[-state.M:]
     if collision or chosen_arm not in estimatedBestArms:
         return estimatedBestArms
@@ -453,8 +684,7 @@ def MCTopM_KLUCB_U(j, state, collision=False):
         state.memories = write_to_tuple(state.memories, j, (-1, False))
     assert isinstance(state.memories[j], tuple)
     chosen_arm, sitted = state.memories[j]
-    indexes = klucb(state.S[j] / state.N[j], c * np.log(state.t) / state.N[j], tolerance)
-    indexes[state.N[j] < 1] = +oo
+    indexes = _klucb_indexes(state.S[j], state.inv_N[j], c * state.log_t)
     estimatedBestArms = np.argsort(indexes)[-state.M:]
     if collision or chosen_arm not in estimatedBestArms:
         return estimatedBestArms
@@ -468,8 +698,7 @@ def MCTopM_KLUCB_Utilde(j, state, collision=False):
         state.memories = write_to_tuple(state.memories, j, (-1, False))
     assert isinstance(state.memories[j], tuple)
     chosen_arm, sitted = state.memories[j]
-    indexes = klucb(state.Stilde[j] / state.N[j], c * np.log(state.t) / state.N[j], tolerance)
-    indexes[state.N[j] < 1] = +oo
+    indexes = _klucb_indexes(state.Stilde[j], state.inv_N[j], c * state.log_t)
     estimatedBestArms = np.argsort(indexes)[-state.M:]
     if collision or chosen_arm not in estimatedBestArms:
         return estimatedBestArms
@@ -483,8 +712,7 @@ def MCTopM_KLUCB_Ubar(j, state, collision=False):
         state.memories = write_to_tuple(state.memories, j, (-1, False))
     assert isinstance(state.memories[j], tuple)
     chosen_arm, sitted = state.memories[j]
-    indexes = klucb((state.Ntilde[j] / state.N[j]) * (state.S[j] / state.N[j]), c * np.log(state.t) / state.N[j], tolerance)
-    indexes[state.N[j] < 1] = +oo
+    indexes = _klucb_bar_indexes(state.S[j], state.inv_N[j], state.Ntilde[j], c * state.log_t)
     estimatedBestArms = np.argsort(indexes)[-state.M:]
     if collision or chosen_arm not in estimatedBestArms:
         return estimatedBestArms
@@ -615,6 +843,21 @@ def tex2pdf(filename):
 
 # --- Data representation'
 
+#: Memoization cache for :meth:`State.explore_from_node_to_depth`: maps ``(hash(state), depth)`` to the ``(probas, children)`` of an already explored subtree.
+#: Different branches frequently reach identical states, so sharing their (immutable once computed) subtree turns the exponential tree into a DAG evaluation.
+#: It has to be cleared between two calls to :func:`main`, as the hash of a state covers neither ``mus`` nor ``players``.
+_subtree_cache = dict()
+
+#: Cache for the decisions of one player in :meth:`State._all_decisions`: maps ``(id(player), t, <bytes of the player's rows of the counters>)`` (plus the player's memory, for :class:`StateWithMemory`) to the decision set returned by the policy.
+#: The same per-player rows recur constantly across the exploration, and each policy call re-runs the full index computation, so the hit rate approaches 1 after the first few nodes.
+#: Also cleared between two calls to :func:`main` (``id()`` of a policy function can be reused once it is garbage collected).
+_policy_cache = dict()
+
+#: Cache for :meth:`State.all_coin_flips_and_probas`: maps ``tuple(mus)`` to the ``(all_coin_flips, probas_of_coin_flips)`` pair (a ``(2^K, K)`` table of flips and their probabilities), which only depends on the means and not on the node.
+#: It is keyed on the content of ``mus``, so it stays valid across calls to :func:`main` and never has to be cleared.
+_flip_probas_cache = dict()
+
+
 class State(object):
     """Not space-efficient representation of a state in the system we model.
 
@@ -626,27 +869,54 @@ class State(object):
     - children: list of all possible next states (transitions).
     """
 
-    def __init__(self, S, Stilde, N, Ntilde, mus, players, depth=0):
-        """Create a new state. Arrays S, Stilde, N, Ntilde are *copied* to avoid modify previous values!"""
-        self.S = np.copy(S)  #: sensing feedback
-        self.Stilde = np.copy(Stilde)  #: number of sensing trials
-        self.N = np.copy(N)  #: number of succesful transmissions
-        self.Ntilde = np.copy(Ntilde)  #: number of trials without collisions
+    def __init__(self, S=None, Stilde=None, N=None, Ntilde=None, mus=None, players=None, depth=0, buf=None, t=None):
+        """Create a new state. Arrays S, Stilde, N, Ntilde are *copied* to avoid modify previous values!
+
+        - The four arrays are packed into one contiguous ``(4, M, K)`` buffer of small unsigned integers (all values are counts bounded by t <= depth <= 20 < 256), so a state costs one allocation and its hash one memcpy, instead of four of each.
+        - If ``buf`` is given instead, it is adopted as the packed buffer *without any copy*: the caller hands over ownership, which is safe since the counters of a state are never mutated once built. This is the fast path used by :meth:`child_from_arrays`.
+        """
+        if buf is not None:
+            self._buf = buf  #: packed contiguous buffer holding the four arrays S, Stilde, N, Ntilde
+        else:
+            # Validation is only done on this slow path (the root states built by main()), not on the per-child fast path
+            assert np.shape(S) == np.shape(Stilde) == np.shape(N) == np.shape(Ntilde), "Error: difference in shapes of S, Stilde, N, Ntilde."
+            assert len(players) == min(np.shape(S)), "Error: 'players' list is not of size M ..."  # DEBUG
+            assert len(mus) == max(np.shape(S)), "Error: 'mus' list is not of size K ..."  # DEBUG
+            self._buf = np.empty((4, ) + np.shape(S), dtype=np.uint8)
+            self._buf[0], self._buf[1], self._buf[2], self._buf[3] = S, Stilde, N, Ntilde
+        self.S = self._buf[0]  #: sensing feedback
+        self.Stilde = self._buf[1]  #: number of sensing trials
+        self.N = self._buf[2]  #: number of succesful transmissions
+        self.Ntilde = self._buf[3]  #: number of trials without collisions
         self.mus = mus  # XXX OK memory efficient: only a pointer to the (never modified) list
         self.players = players  # XXX OK memory efficient: only a pointer to the (never modified) list
         # New arguments
         self.depth = depth  #: current depth of the exploration tree
-        self.t = np.sum(N[0])  #: current time step. Simply = sum(N[0]) = sum(N[i]) for all player i, but easier to compute it once and store it
-        assert np.shape(S) == np.shape(Stilde) == np.shape(N) == np.shape(Ntilde), "Error: difference in shapes of S, Stilde, N, Ntilde."
-        self.M = min(np.shape(S))  #: number of players
-        assert len(players) == self.M, "Error: 'players' list is not of size M ..."  # DEBUG
-        self.K = max(np.shape(S))  #: number of arms (channels)
-        assert len(mus) == self.K, "Error: 'mus' list is not of size K ..."  # DEBUG
+        self.t = int(np.sum(self.N[0])) if t is None else t  #: current time step. Simply = sum(N[0]) = sum(N[i]) for all player i; the children know it is the parent's t + 1 without summing anything
+        self.M = min(self.S.shape)  #: number of players
+        self.K = max(self.S.shape)  #: number of arms (channels)
         self.children = []  #: list of next state, representing all the possible transitions
         self.probas = []  #: probabilities of transitions
+        self._log_t = None  # lazily computed log(t), see the log_t property
+        self._inv_N = None  # lazily computed 1/N, see the inv_N property
+        self._hash = None  # lazily computed hash, see __hash__ (the counters of a state never change once built)
 
     # --- Utility
 
+    @property
+    def log_t(self):
+        """:math:`\log(t)` (and :math:`-\infty` for t = 0), computed once per node and cached: all the M players need it for their exploration term, so it was computed M times per node."""
+        if self._log_t is None:
+            self._log_t = np.log(self.t) if self.t > 0 else -oo
+        return self._log_t
+
+    @property
+    def inv_N(self):
+        """:math:`1 / N` element-wise, with 0 for arms never sampled, computed once per node and cached: the index kernels multiply by it instead of dividing, and use ``inv_N[j][i] == 0`` as the not-sampled sentinel."""
+        if self._inv_N is None:
+            self._inv_N = np.divide(1.0, self.N, out=np.zeros(np.shape(self.N)), where=self.N >= 1)
+        return self._inv_N
+
     def __str__(self, concise=CONCISE):
         if concise:
             return "    State : M = {}, K = {} and t = {}, depth = {}.\n{} =: Stilde\n{} =: N\n".format(self.M, self.K, self.t, self.depth, self.Stilde, self.N)
@@ -754,15 +1024,33 @@ class State(object):
         # done for saving the graph
 
     def copy(self):
-        """Get a new copy of that state with same S, Stilde, N, Ntilde but no probas and no children (and depth=0)."""
-        return State(S=self.S, Stilde=self.Stilde, N=self.N, Ntilde=self.Ntilde, mus=self.mus, players=self.players, depth=self.depth)
+        """Get a new copy of that state with same S, Stilde, N, Ntilde but no probas and no children (one buffer copy instead of four array copies)."""
+        return State(mus=self.mus, players=self.players, depth=self.depth, buf=np.copy(self._buf), t=self.t)
+
+    def _is_symmetric(self):
+        """Whether all players use the same policy: then states differing only by a permutation of the player rows are behaviorally identical."""
+        return len(set(id(player) for player in self.players)) == 1
 
     def __hash__(self, full=FULLHASH):
-        """Hash the matrix Stilde and N of the state."""
-        if full:
-            return hash(tupleit2(self.S)) + hash(tupleit2(self.N)) + hash(tupleit2(self.Stilde)) + hash(tupleit2(self.Ntilde) + (self.t, self.depth, ))
-        else:
-            return hash(tupleit2(self.Stilde)) + hash(tupleit2(self.N))
+        """Hash the matrix Stilde and N of the state.
+
+        - The packed uint8 buffer is folded into one arbitrary-precision integer (one byte per counter, a Morton-style compact key), instead of converting every matrix to nested tuples of Python integers for every single state.
+        - If all players use the same policy, the per-player slabs are sorted before packing, so permuted but behaviorally identical states collapse to one canonical representative in the deduplication dictionaries (up to a factor :math:`M!` less children).
+        - The result is cached on the instance: the counters of a state never change once built, and each state is hashed several times (child deduplication, the subtree memo, leaf merging), so all but the first call cost a single attribute lookup.
+        """
+        if self._hash is None:
+            buf = self._buf if full else self._buf[1:3]  # hash only Stilde and N in concise mode, like before
+            if self._is_symmetric():
+                key = b"".join(sorted(player_slab.tobytes() for player_slab in buf.transpose(1, 0, 2)))
+            else:
+                key = buf.tobytes()
+            packed = int.from_bytes(key, 'little')
+            self._hash = hash((packed, self.t, self.depth)) if full else hash(packed)
+        return self._hash
+
+    def __eq__(self, other):
+        """Two states are equal when their actual contents match (packed counters, t and depth), not merely their hashes: a dict lookup keyed on states then survives a hash collision of the packed buffers (the deduplication dictionaries key on explicit hashes, so they keep the canonical player-permutation merging of :meth:`__hash__`)."""
+        return isinstance(other, State) and self.t == other.t and self.depth == other.depth and np.array_equal(self._buf, other._buf)
 
     def is_absorbing(self):
         """Try to detect if this state is absorbing, ie only one transition is possible, and again infinitely for the only child.
@@ -796,33 +1084,45 @@ class State(object):
     # --- High level view of a depth-1 exploration
 
     def explore_from_node_to_depth(self, depth=1):
-        """Compute recursively the one_depth children of the root and its children."""
-        print("\nFor depth = {}, exploring from this node :\n{}".format(depth, self))  # DEBUG
+        """Compute the one_depth children of the root and its children, down to the asked depth.
+
+        - Iterative DFS with an explicit stack (a list, LIFO), instead of one interpreter recursion per node: no recursion limit, and no Python frame per live node.
+        - Memoized with ``_subtree_cache``: when two branches reach the same state (same hash) with the same remaining depth, the subtree is explored only once and its ``(probas, children)`` lists are shared (they are never mutated once computed).
+        """
         if depth == 0:
+            if VERBOSE: print("\nFor depth = {}, exploring from this node :\n{}".format(depth, self))  # DEBUG
             return
-        self.compute_one_depth()
-        self.depth = depth
-        if depth > 1:
-            for child in self.children:
-                child.explore_from_node_to_depth(depth=depth-1)
+        to_explore = [(self, depth)]  # DFS using a list as the stack of (node, remaining depth)
+        while to_explore:
+            node, node_depth = to_explore.pop()
+            if VERBOSE: print("\nFor depth = {}, exploring from this node :\n{}".format(node_depth, node))  # DEBUG
+            key = (hash(node), node_depth)
+            if key in _subtree_cache:
+                node.probas, node.children = _subtree_cache[key]
+                node.depth = node_depth
+                continue
+            node.depth = node_depth  # set once, before the children are built one step deeper from it
+            node.compute_one_depth()
+            if node_depth > 1:
+                for child in reversed(node.children):  # reversed, so the stack pops them in the original order
+                    to_explore.append((child, node_depth - 1))
+            _subtree_cache[key] = (node.probas, node.children)
 
     def compute_one_depth(self):
-        """Use all_deltas to store all the possible transitions and their probabilities. Increase depth by 1 at the end."""
-        self.depth += 1
+        """Use all_deltas to store all the possible transitions and their probabilities (the children are built one step deeper than the node's current depth, no depth bookkeeping is done here)."""
         uniq_children = dict()
         uniq_probas = dict()
-        for delta, proba in self.all_deltas():
+        for arrays, proba in self.all_deltas():
             if proba == 0: continue
-            # copy the current state, apply decision of algorithms and random branching
-            child = delta(self.copy())
+            # build the child state from the already-computed arrays of the transition
+            child = self.child_from_arrays(arrays)
             h = hash(child)  # I guess I could use states directly as key, but this would cost more in terms of memory
             if h in uniq_children:
                 uniq_probas[h] += proba
             else:
-                assert child.depth == (self.depth - 1)
                 uniq_children[h] = child
                 uniq_probas[h] = proba
-        print("   at depth {} we saw {} different unique children states...".format(self.t, len(uniq_children)))
+        if VERBOSE: print("   at depth {} we saw {} different unique children states...".format(self.t, len(uniq_children)))
         self.probas = [simplify(p) for p in uniq_probas.values()]
         self.children = list(uniq_children.values())
         # Done for computing all the children and probability of transitions
@@ -838,8 +1138,8 @@ class State(object):
         for proba, bad_child in self.absorbing_states_one_depth():
             # print("all_absorbing_states: yielding proba, child = {}, \n{}".format(proba, bad_child))  # DEBUG
             yield proba, bad_child
+        self.depth = depth  # set once, before the children are built one step deeper from it
         self.compute_one_depth()
-        self.depth = depth
         if depth > 1:
             for child in self.children:
                 for proba, bad_child in child.all_absorbing_states(depth=depth-1):
@@ -848,11 +1148,10 @@ class State(object):
 
     def absorbing_states_one_depth(self):
         """Use all_deltas to yield all the absorbing one-depth child and their probabilities."""
-        self.depth += 1
-        for delta, proba in self.all_deltas():
+        for arrays, proba in self.all_deltas():
             if proba == 0: continue
-            # copy the current state, apply decision of algorithms and random branching
-            child = delta(self.copy())
+            # build the child state from the already-computed arrays of the transition
+            child = self.child_from_arrays(arrays)
             if child.is_absorbing():
                 # print("absorbing_states_one_depth: yielding proba, child = {}, \n{}".format(proba, child))  # DEBUG
                 yield proba, child
@@ -870,34 +1169,86 @@ class State(object):
 
     # --- The hard part is this all_deltas *generator*
 
+    def child_from_arrays(self, buf):
+        """Build a child state (one step deeper) directly from a packed ``(4, M, K)`` buffer yielded by :meth:`all_deltas` (adopted without copy, see :meth:`__init__`)."""
+        return State(mus=self.mus, players=self.players, depth=self.depth - 1, buf=buf, t=self.t + 1)
+
+    def _all_decisions(self):
+        """Decision sets of every player, memoized in ``_policy_cache``: the key contains the player and exactly what the policy can read, ie. its index, its own rows of the four counters and the time step, so identical situations recurring across the exploration skip the index computation entirely."""
+        all_decisions = []
+        for j, player in enumerate(self.players):
+            key = (id(player), j, self.t, self._buf[:, j, :].tobytes())
+            try:
+                decisions = _policy_cache[key]
+            except KeyError:
+                decisions = _policy_cache[key] = player(j, self)
+            all_decisions.append(decisions)
+        return all_decisions
+
+    def _arrays_for_decisions(self, decisions, FLIPS, rows):
+        """Compute, for one decision profile, the packed buffers of all the :math:`2^K` children at once, as one ``(2^K, 4, M, K)`` batch (a single allocation for all the coin-flip branches).
+
+        - The ``S`` and ``Stilde`` planes are built by a single numpy broadcast (one slab per coin flip), since the coin-flip branches only differ by which binary vector is added;
+        - the ``N`` and ``Ntilde`` planes do not depend on the coin flips, so they are computed once and broadcast to all the branches.
+        """
+        decisions = np.asarray(decisions)
+        collisions = np.bincount(decisions, minlength=self.K) >= 2  # one C-level pass over the M decisions, instead of a Counter and a list comprehension over the K arms
+        free = ~collisions[decisions]  # players that did not collide
+        delta = np.zeros((len(FLIPS), self.M, self.K), dtype=self.S.dtype)
+        delta[:, rows, decisions] = FLIPS[:, decisions]  # sensing feedback of each player, for every coin flip
+        child_bufs = np.empty((len(FLIPS), ) + self._buf.shape, dtype=np.uint8)
+        child_bufs[:, 0] = self.S[np.newaxis, :, :] + delta
+        child_bufs[:, 1] = self.Stilde[np.newaxis, :, :] + np.where(free[np.newaxis, :, np.newaxis], delta, 0)  # only non-colliding players receive the reward feedback
+        N = np.copy(self.N)
+        N[rows, decisions] += 1  # number of sensing trials
+        child_bufs[:, 2] = N
+        Ntilde = np.copy(self.Ntilde)
+        Ntilde[rows[free], decisions[free]] += 1  # number of trials without collisions
+        child_bufs[:, 3] = Ntilde
+        return child_bufs, collisions
+
+    def all_coin_flips_and_probas(self):
+        """Compute the ``(2^K, K)`` table of possible coin flips of the K arms, and their probabilities (they depend on neither the node nor the decisions of the players, so they are computed once per problem and cached in ``_flip_probas_cache``).
+
+        - For plain float means the :math:`2^K` probabilities are computed in one vectorized ``np.prod(np.where(...))``, the generic Python product is kept for sympy symbols and fractions.
+        """
+        key = tupleit1(self.mus)
+        try:
+            return _flip_probas_cache[key]
+        except KeyError:
+            pass
+        # Bit-counting enumeration: row number f of the table is the binary writing of f, bit k being the flip of arm k, with no 2^K Python tuples from itertools.product
+        all_coin_flips = np.asarray((np.arange(1 << self.K)[:, np.newaxis] >> np.arange(self.K)) & 1, dtype=np.uint8)
+        if all(isinstance(mu, float) for mu in self.mus):
+            mus = np.asarray(self.mus)
+            probas_of_coin_flips = np.prod(np.where(all_coin_flips.astype(bool), mus, 1 - mus), axis=1).tolist()
+        else:
+            probas_of_coin_flips = [ prod(mu if b else (1 - mu) for b, mu in zip(coin_flips, self.mus)) for coin_flips in all_coin_flips ]
+        _flip_probas_cache[key] = (all_coin_flips, probas_of_coin_flips)
+        return all_coin_flips, probas_of_coin_flips
+
     def all_deltas(self):
-        """Generator that yields functions transforming state to another state.
+        """Generator that yields all the possible transitions, as tuples ``(buf, proba)`` where ``buf`` is the packed ``(4, M, K)`` buffer of the child state, to feed to :meth:`child_from_arrays`.
 
         - It is memory efficient as it is a generator.
-        - Do not convert that to a list or it might use all your system memory: each returned value is a function with code and variables inside!
+        - For each decision profile, the :math:`2^K` coin-flip branches are built by one numpy broadcast in :meth:`_arrays_for_decisions`, instead of :math:`2^K` Python-level state updates.
+        - When every player is deterministic here (all decision sets are singletons, the common case away from ties), the ``itertools.product`` and the division of the probabilities by 1 are skipped entirely.
         """
-        all_decisions = [ player(j, self) for j, player in enumerate(self.players) ]
+        all_decisions = self._all_decisions()
         number_of_decisions = prod(len(decisions) for decisions in all_decisions)
-        for decisions in product(*all_decisions):
-            counter = Counter(decisions)
-            collisions = [counter.get(k, 0) >= 2 for k in range(self.K)]
-            for coin_flips in product([0, 1], repeat=self.K):
-                proba_of_this_coin_flip = prod(mu if b else (1 - mu) for b, mu in zip(coin_flips, self.mus))
-                # Create a function to apply this transition
-                def delta(s):
-                    s.t += 1
-                    s.depth -= 1
-                    for j, Ij in enumerate(decisions):
-                        s.S[j, Ij] += coin_flips[Ij]  # sensing feedback
-                        s.N[j, Ij] += 1  # number of sensing trials
-                        if not collisions[Ij]:  # no collision, receive this feedback for rewards
-                            s.Stilde[j, Ij] += coin_flips[Ij]  # number of succesful transmissions
-                            s.Ntilde[j, Ij] += 1  # number of trials without collisions
-                    return s
+        FLIPS, probas_of_coin_flips = self.all_coin_flips_and_probas()
+        rows = np.arange(self.M)
+        if number_of_decisions == 1:  # deterministic: a single decision profile, only the coin flips branch
+            decision_profiles = [ tuple(decisions[0] for decisions in all_decisions) ]
+        else:
+            decision_profiles = product(*all_decisions)
+        for decisions in decision_profiles:
+            child_bufs, _ = self._arrays_for_decisions(decisions, FLIPS, rows)
+            for f, proba_of_this_coin_flip in enumerate(probas_of_coin_flips):
                 # Compute the probability of this transition
-                proba = proba_of_this_coin_flip / number_of_decisions
+                proba = proba_of_this_coin_flip if number_of_decisions == 1 else proba_of_this_coin_flip / number_of_decisions
                 if proba == 0: continue
-                yield (delta, proba)
+                yield (child_bufs[f], proba)
 
     # --- Main functions, all explorations are depth first search (not the best, it's just easier...)
 
@@ -917,20 +1268,24 @@ class State(object):
             print("\n==> Done for the {} children of this state...\n".format(len(self.children)))
 
     def get_all_leafs(self):
-        """Recurse and get all the leafs. Many different state can be present in the list of leafs, with possibly different probabilities (each correspond to a trajectory)."""
+        """Get all the leafs. Many different state can be present in the list of leafs, with possibly different probabilities (each correspond to a trajectory).
+
+        - Iterative DFS carrying the accumulated trajectory probability in each stack frame, instead of recursing and multiplying whole lists of probabilities at every level.
+        """
         if self.depth <= 1:
             return self.probas, self.children
-        else:
-            complete_probas, leafs = [], []
-            # assert len(self.probas) > 0
-            for (proba, child) in zip(self.probas, self.children):
-                # assert child.depth == (self.depth - 1)
-                c, l = child.get_all_leafs()
-                # assert all([s.depth == 0 for s in l])
-                c = [proba * p for p in c]  # one more step, multiply but a proba
-                complete_probas.extend(c)
-                leafs.extend(l)
-            return complete_probas, leafs
+        complete_probas, leafs = [], []
+        to_visit = [(self, 1)]  # DFS using a list as the stack of (node, probability of reaching it)
+        while to_visit:
+            node, path_proba = to_visit.pop()
+            if node.depth <= 1:  # children of this node are leafs
+                for (proba, child) in zip(node.probas, node.children):
+                    complete_probas.append(path_proba * proba)
+                    leafs.append(child)
+            else:
+                for (proba, child) in zip(reversed(node.probas), reversed(node.children)):  # reversed, so the stack pops them in the original order
+                    to_visit.append((child, path_proba * proba))
+        return complete_probas, leafs
 
     def get_unique_leafs(self):
         """Compute all the leafs (deepest children) and merge the common one to compute their full probabilities."""
@@ -964,8 +1319,8 @@ class State(object):
 class StateWithMemory(State):
     """State with a memory for each player, to represent and play with RhoRand etc."""
 
-    def __init__(self, S, Stilde, N, Ntilde, mus, players, update_memories, memories=None, depth=0):
-        super(StateWithMemory, self).__init__(S, Stilde, N, Ntilde, mus, players, depth=depth)
+    def __init__(self, S=None, Stilde=None, N=None, Ntilde=None, mus=None, players=None, update_memories=None, memories=None, depth=0, buf=None, t=None):
+        super(StateWithMemory, self).__init__(S=S, Stilde=Stilde, N=N, Ntilde=Ntilde, mus=mus, players=players, depth=depth, buf=buf, t=t)
         self.update_memories = update_memories
         if memories is None:
             memories = tuple(1 for _ in range(self.M))
@@ -986,16 +1341,30 @@ class StateWithMemory(State):
             return "[[" + "], [".join(",".join("{:.3g}:{:.3g}/{}:{}".format(s, st, n, nt) for s, st, n, nt in zip(s2, st2, n2, nt2)) for s2, st2, n2, nt2 in zip(self.S, self.Stilde, self.N, self.Ntilde)) + "]]" + " ranks = {}".format(self.memories)
 
     def copy(self):
-        """Get a new copy of that state with same S, Stilde, N, Ntilde but no probas and no children (and depth=0)."""
-        return StateWithMemory(S=self.S, Stilde=self.Stilde, N=self.N, Ntilde=self.Ntilde, mus=self.mus, players=self.players, update_memories=self.update_memories, depth=self.depth, memories=self.memories)
+        """Get a new copy of that state with same S, Stilde, N, Ntilde but no probas and no children (one buffer copy instead of four array copies)."""
+        return StateWithMemory(mus=self.mus, players=self.players, update_memories=self.update_memories, depth=self.depth, memories=self.memories, buf=np.copy(self._buf), t=self.t)
+
+    def _is_symmetric(self):
+        """Whether all players use the same policy *and* the same memory update: then player rows (with their memories) can be permuted freely."""
+        return super(StateWithMemory, self)._is_symmetric() and len(set(id(um) for um in self.update_memories)) == 1
 
     def __hash__(self, full=FULLHASH):
-        """Hash the matrix Stilde and N of the state and memories of the players (ie. ranks for RhoRand)."""
-        if full:
-            return hash(tupleit2(self.S)) + hash(tupleit2(self.N)) + hash(tupleit2(self.Stilde)) + hash(tupleit2(self.Ntilde) + (self.t, self.depth, )) + hash(tupleit1(self.memories))
-        else:
-            # return hash(tupleit2(self.S) + tupleit2(self.N) + tupleit1(self.memories))  # if U is used instead of Utilde
-            return hash(tupleit2(self.Stilde)) + hash(tupleit2(self.N)) + hash(tupleit1(self.memories))
+        """Hash the matrix Stilde and N of the state and memories of the players (ie. ranks for RhoRand).
+
+        - Like :meth:`State.__hash__`, it folds the packed buffer into per-player integers, sorts the per-player keys (with their memories attached) when all players are identical to collapse permuted states, and caches the result on the instance.
+        """
+        if self._hash is None:
+            buf = self._buf if full else self._buf[1:3]  # hash only Stilde and N in concise mode, like before
+            if self._is_symmetric():
+                key = tuple(sorted(zip((int.from_bytes(player_slab.tobytes(), 'little') for player_slab in buf.transpose(1, 0, 2)), self.memories)))
+            else:
+                key = (int.from_bytes(buf.tobytes(), 'little'), tupleit1(self.memories))
+            self._hash = hash((key, self.t, self.depth)) if full else hash(key)
+        return self._hash
+
+    def __eq__(self, other):
+        """Like :meth:`State.__eq__`, but the memories of the players must match too."""
+        return isinstance(other, StateWithMemory) and self.memories == other.memories and super(StateWithMemory, self).__eq__(other)
 
     def is_absorbing(self):
         """Try to detect if this state is absorbing, ie only one transition is possible, and again infinitely for the only child.
@@ -1008,38 +1377,55 @@ class StateWithMemory(State):
         else:
             return super(StateWithMemory, self).is_absorbing()
 
+    def child_from_arrays(self, arrays):
+        """Build a child state directly from a ``(buf, memories)`` pair, like :meth:`State.child_from_arrays`, but also set the internal memories (ranks etc)."""
+        buf, memories = arrays
+        return StateWithMemory(mus=self.mus, players=self.players, update_memories=self.update_memories, memories=memories, depth=self.depth - 1, buf=buf, t=self.t + 1)
+
+    def _all_decisions(self):
+        """Like :meth:`State._all_decisions`, but the cache key also contains the player's memory, and its (possibly rewritten) memory is replayed on a cache hit: the MCTopM players normalize their memory slot as a side effect of the call, which must not be skipped."""
+        all_decisions = []
+        for j, player in enumerate(self.players):
+            key = (id(player), j, self.t, self._buf[:, j, :].tobytes(), self.memories[j])
+            try:
+                decisions, memory_after = _policy_cache[key]
+                if memory_after is not None:
+                    self.memories = write_to_tuple(self.memories, j, memory_after)
+            except KeyError:
+                memory_before = self.memories[j]
+                decisions = player(j, self)
+                memory_now = self.memories[j]
+                # Type-safe change test: memories are heterogeneous (a rank scalar or a tuple), and numpy's reflected != on scalar-vs-tuple broadcasts to an array instead of returning a bool
+                memory_after = memory_now if (type(memory_now) is not type(memory_before) or memory_now != memory_before) else None
+                _policy_cache[key] = (decisions, memory_after)
+            all_decisions.append(decisions)
+        return all_decisions
+
     def all_deltas(self):
-        """Generator that yields functions transforming state to another state.
+        """Generator that yields all the possible transitions, as tuples ``((buf, memories), proba)`` where ``buf`` is the packed ``(4, M, K)`` buffer of the child state, to feed to :meth:`child_from_arrays`.
 
         - It is memory efficient as it is a generator.
-        - Do not convert that to a list or it might use all your system memory: each returned value is a function with code and variables inside!
+        - The batched buffers of :meth:`State._arrays_for_decisions` are computed once per decision profile and shared by all the (memories x coin flips) branches (safe, since the counters of a state are never mutated once built).
         """
-        all_decisions = [ player(j, self) for j, player in enumerate(self.players) ]
+        all_decisions = self._all_decisions()
         number_of_decisions = prod(len(decisions) for decisions in all_decisions)
-        for decisions in product(*all_decisions):
-            counter = Counter(decisions)
-            collisions = [counter.get(k, 0) >= 2 for k in range(self.K)]
+        FLIPS, probas_of_coin_flips = self.all_coin_flips_and_probas()
+        rows = np.arange(self.M)
+        if number_of_decisions == 1:  # deterministic: a single decision profile, only the memories and coin flips branch
+            decision_profiles = [ tuple(decisions[0] for decisions in all_decisions) ]
+        else:
+            decision_profiles = product(*all_decisions)
+        for decisions in decision_profiles:
+            child_bufs, collisions = self._arrays_for_decisions(decisions, FLIPS, rows)
             all_memories = [ update_memory(j, self, decisions[j], collisions[decisions[j]]) for j, update_memory in enumerate(self.update_memories) ]
             number_of_memories = prod(len(memories) for memories in all_memories)
+            number_of_branches = number_of_decisions * number_of_memories
             for memories in product(*all_memories):
-                for coin_flips in product([0, 1], repeat=self.K):
-                    proba_of_this_coin_flip = prod(mu if b else (1 - mu) for b, mu in zip(coin_flips, self.mus))
-                    # Create a function to apply this transition
-                    def delta(s):
-                        s.memories = memories  # Erase internal ranks etc
-                        s.t += 1
-                        s.depth -= 1
-                        for j, Ij in enumerate(decisions):
-                            s.S[j, Ij] += coin_flips[Ij]  # sensing feedback
-                            s.N[j, Ij] += 1  # number of sensing trials
-                            if not collisions[Ij]:  # no collision, receive this feedback for rewards
-                                s.Stilde[j, Ij] += coin_flips[Ij]  # number of succesful transmissions
-                                s.Ntilde[j, Ij] += 1  # number of trials without collisions
-                        return s
+                for f, proba_of_this_coin_flip in enumerate(probas_of_coin_flips):
                     # Compute the probability of this transition
-                    proba = proba_of_this_coin_flip / (number_of_decisions * number_of_memories)
+                    proba = proba_of_this_coin_flip if number_of_branches == 1 else proba_of_this_coin_flip / number_of_branches
                     if proba == 0: continue
-                    yield (delta, proba)
+                    yield ((child_bufs[f], memories), proba)
 
 
 # --- Main function
@@ -1052,6 +1438,8 @@ def main(depth=1, players=None, update_memories=None, mus=None, M=2, K=2, S=None
     if mus is None:
         mus = symbol_means(K=K)
     K = len(mus)
+    if not any(hasattr(mu, "evalf") or isinstance(mu, Fraction) for mu in mus):
+        mus = [float(mu) for mu in mus]  # purely numeric problem: normalize to plain floats once, so every node takes the vectorized probability path instead of the generic sympy/Fraction one
     if players is None:
         players = [default_policy for _ in range(M)]
     # if update_memories is None:
@@ -1061,13 +1449,13 @@ def main(depth=1, players=None, update_memories=None, mus=None, M=2, K=2, S=None
     assert 0 <= depth <= 20, "Error: only 0 <= depth <= 20 is supported... and depth = {} here...".format(depth)  # XXX it is probably impossible to have a code managing larger values...
     # Compute starting state
     if S is None:
-        S = np.zeros((M, K), dtype=int)  # Use only integers, to speed up in this case of Bernoulli arms. XXX in the general case it is not true!
+        S = np.zeros((M, K), dtype=np.uint8)  # Use only small integers, to speed up in this case of Bernoulli arms (counts are bounded by depth <= 20). XXX in the general case it is not true!
     if Stilde is None:
-        Stilde = np.zeros((M, K), dtype=int)  # Use only integers, to speed up in this case of Bernoulli arms. XXX in the general case it is not true!
+        Stilde = np.zeros((M, K), dtype=np.uint8)  # Use only small integers, to speed up in this case of Bernoulli arms (counts are bounded by depth <= 20). XXX in the general case it is not true!
     if N is None:
-        N = np.zeros((M, K), dtype=int)
+        N = np.zeros((M, K), dtype=np.uint8)
     if Ntilde is None:
-        Ntilde = np.zeros((M, K),  dtype=int)
+        Ntilde = np.zeros((M, K),  dtype=np.uint8)
     # Create the root state
     if update_memories is not None:
         root = StateWithMemory(S=S, Stilde=Stilde, N=N, Ntilde=Ntilde, mus=mus, players=players, update_memories=update_memories)
@@ -1092,6 +1480,8 @@ def main(depth=1, players=None, update_memories=None, mus=None, M=2, K=2, S=None
             print("At depth {}, this node was found to be absorbing with probability {}:\n{}".format(bad_child.t, proba, bad_child))
     else:
         # Explore from the root
+        _subtree_cache.clear()  # the cached subtrees are only valid for one (mus, players) problem
+        _policy_cache.clear()  # same for the cached decisions of the players
         root.explore_from_node_to_depth(depth=depth)
         # Print everything
         # root.pretty_print_result_recursively()